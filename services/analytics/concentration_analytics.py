@@ -0,0 +1,374 @@
+"""
+Vectorized concentration analytics over the collected history.
+
+Loads every stored market_data.json into column arrays (one row per trading
+date, one column per Magnificent 7 company) and computes rankings,
+concentration shares, HHI, rolling windows and drawdowns for all dates in
+one pass, instead of per-date dict loops or Athena round trips.
+
+The computed state can be saved and reloaded with each day's document
+version (ETag or modification time); the update_from_* methods then only read
+the days that are new or were rewritten since, such as repaired days. New days
+only compute their own rows, reusing the stored running peaks and the last
+rolling window of history.
+
+Usage:
+    python concentration_analytics.py --data-dir ../local/market-data --state analytics.npz
+    python concentration_analytics.py --bucket my-bucket --state analytics.npz --output-dir ./analytics
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from day_documents import (
+    list_directory_partitions,
+    list_s3_partitions,
+    load_directory_documents,
+    load_s3_documents
+)
+
+# Trading days in the rolling windows
+ROLLING_WINDOW = int(os.environ.get('ANALYTICS_ROLLING_WINDOW', '20'))
+
+MAGNIFICENT_7 = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA"]
+
+def documents_to_columns(documents, tickers):
+    """
+    Converts day documents into column arrays.
+
+    Returns:
+        tuple: (dates, market_caps, sp500_totals) where market_caps has one
+            column per ticker and NaN where a company was not collected
+    """
+    dates = np.array([document['trading_date'] for document in documents], dtype='datetime64[D]')
+    market_caps = np.full((len(documents), len(tickers)), np.nan)
+    sp500_totals = np.full(len(documents), np.nan)
+
+    columns = {ticker: index for index, ticker in enumerate(tickers)}
+    for row, document in enumerate(documents):
+        for ticker, company in document.get('companies', {}).items():
+            if ticker in columns and company.get('market_cap'):
+                market_caps[row, columns[ticker]] = company['market_cap']
+
+        total = document.get('sp500_details', {}).get('total_market_cap')
+        if total:
+            sp500_totals[row] = total
+
+    order = np.argsort(dates)
+    return dates[order], market_caps[order], sp500_totals[order]
+
+def rank_rows(values):
+    """
+    Ranks each row in descending order (1 = largest); NaN gets rank 0.
+    """
+    order = np.argsort(-np.where(np.isnan(values), -np.inf, values), axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, values.shape[1] + 1), axis=1)
+    return np.where(np.isnan(values), 0, ranks)
+
+def drawdowns(values, previous_peak=None):
+    """
+    Returns (drawdown from running peak, running peak) along axis 0.
+
+    Args:
+        values (np.ndarray): 1-D or 2-D series, rows in date order
+        previous_peak (np.ndarray): Peak before the first row, for incremental updates
+    """
+    if previous_peak is not None:
+        values = np.concatenate([np.asarray(previous_peak)[np.newaxis], values])
+
+    # fmax ignores NaN, so a missing day does not reset the peak
+    peaks = np.fmax.accumulate(values, axis=0)
+    drawdown = values / peaks - 1
+
+    if previous_peak is not None:
+        return drawdown[1:], peaks[1:]
+    return drawdown, peaks
+
+class ConcentrationAnalytics:
+    """
+    Column-oriented concentration metrics for every collected trading date.
+
+    Inputs are kept as arrays (dates, market_caps[date, ticker],
+    sp500_totals[date]) and every derived metric is an array of the same
+    length, computed with whole-array NumPy operations. Rows are always in
+    date order.
+
+    Args:
+        tickers (list): Company columns, defaults to the Magnificent 7
+        window (int): Trading days in the rolling windows
+    """
+    def __init__(self, tickers=None, window=ROLLING_WINDOW):
+        self.tickers = list(tickers or MAGNIFICENT_7)
+        self.window = window
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.market_caps = np.empty((0, len(self.tickers)))
+        self.sp500_totals = np.empty(0)
+        self.metrics = {}
+        # Document version each stored date was loaded from
+        self.versions = {}
+
+    @property
+    def last_date(self):
+        return str(self.dates[-1]) if len(self.dates) else None
+
+    def add_documents(self, documents):
+        """
+        Adds day documents and computes their metrics.
+
+        Days after the last stored date only compute their own rows. Days
+        that are earlier or already stored (recollected) trigger a full
+        recompute so the running peaks and windows stay correct.
+
+        Returns:
+            int: Number of rows computed
+        """
+        if not documents:
+            return 0
+
+        dates, market_caps, sp500_totals = documents_to_columns(documents, self.tickers)
+        appending = not len(self.dates) or dates[0] > self.dates[-1]
+
+        if appending:
+            start = len(self.dates)
+            self.dates = np.concatenate([self.dates, dates])
+            self.market_caps = np.concatenate([self.market_caps, market_caps])
+            self.sp500_totals = np.concatenate([self.sp500_totals, sp500_totals])
+        else:
+            # Newer documents replace stored rows for the same date
+            merged = dict(zip(self.dates.tolist(), zip(self.market_caps, self.sp500_totals)))
+            merged.update(zip(dates.tolist(), zip(market_caps, sp500_totals)))
+            ordered = sorted(merged)
+            start = 0
+            self.dates = np.array(ordered, dtype='datetime64[D]')
+            self.market_caps = np.array([merged[day][0] for day in ordered])
+            self.sp500_totals = np.array([merged[day][1] for day in ordered])
+
+        self.compute(start)
+        return len(self.dates) - start
+
+    def compute(self, start=0):
+        """
+        Computes metrics for rows start onwards, reusing earlier rows' state.
+        """
+        caps = self.market_caps[start:]
+        sp500 = self.sp500_totals[start:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mag7_total = np.nansum(caps, axis=1)
+            mag7_total[np.all(np.isnan(caps), axis=1)] = np.nan
+            pct_of_mag7 = caps / mag7_total[:, np.newaxis] * 100
+            pct_of_sp500 = caps / sp500[:, np.newaxis] * 100
+            mag7_pct_of_sp500 = mag7_total / sp500 * 100
+
+        rows = {
+            'mag7_total_market_cap': mag7_total,
+            'mag7_pct_of_sp500': mag7_pct_of_sp500,
+            'pct_of_mag7': pct_of_mag7,
+            'pct_of_sp500': pct_of_sp500,
+            'rank': rank_rows(caps),
+            # Herfindahl-Hirschman index of the Mag 7 shares (0-10,000)
+            'hhi': np.where(np.isnan(mag7_total), np.nan, np.nansum(pct_of_mag7 ** 2, axis=1)),
+            # Share of the S&P 500 held by the single largest company
+            'top_pct_of_sp500': np.fmax.reduce(pct_of_sp500, axis=1)
+        }
+
+        previous = lambda name: self.metrics[name][start - 1] if start else None
+        rows['mag7_drawdown'], rows['mag7_peak'] = drawdowns(mag7_total, previous('mag7_peak'))
+        rows['company_drawdown'], rows['company_peak'] = drawdowns(caps, previous('company_peak'))
+
+        if start:
+            for name, values in rows.items():
+                self.metrics[name] = np.concatenate([self.metrics[name][:start], values])
+        else:
+            self.metrics = rows
+
+        self.compute_rolling(start)
+
+    def compute_rolling(self, start=0):
+        """
+        Rolling means, volatility and changes over `window` trading days.
+
+        Only rows from start onwards are recomputed; they need the preceding
+        window - 1 rows of history, not the whole series.
+        """
+        offset = max(0, start - self.window + 1)
+        concentration = pd.Series(self.metrics['mag7_pct_of_sp500'][offset:])
+        mag7_total = pd.Series(self.metrics['mag7_total_market_cap'][offset:])
+        rolling = concentration.rolling(self.window, min_periods=1)
+
+        rows = {
+            'rolling_mag7_pct_of_sp500': rolling.mean().to_numpy(),
+            'rolling_mag7_pct_of_sp500_std': rolling.std().to_numpy(),
+            'rolling_mag7_pct_of_sp500_change': (concentration - concentration.shift(self.window - 1)).to_numpy(),
+            'rolling_mag7_return': (mag7_total / mag7_total.shift(self.window - 1) - 1).to_numpy()
+        }
+
+        for name, values in rows.items():
+            values = values[start - offset:]
+            if start and name in self.metrics:
+                self.metrics[name] = np.concatenate([self.metrics[name][:start], values])
+            else:
+                self.metrics[name] = values
+
+    def daily_frame(self):
+        """
+        Returns one row per trading date with the index-level metrics.
+        """
+        frame = pd.DataFrame({
+            name: values for name, values in self.metrics.items() if values.ndim == 1
+        }, index=pd.DatetimeIndex(self.dates, name='trading_date'))
+        frame.insert(1, 'sp500_total_market_cap', self.sp500_totals)
+        return frame
+
+    def company_frame(self):
+        """
+        Returns one row per trading date and company, long format.
+        """
+        columns = {'market_cap': self.market_caps}
+        columns.update({name: values for name, values in self.metrics.items() if values.ndim == 2})
+
+        frame = pd.DataFrame({
+            name: values.ravel() for name, values in columns.items()
+        }, index=pd.MultiIndex.from_product(
+            [pd.DatetimeIndex(self.dates), self.tickers], names=['trading_date', 'ticker']
+        ))
+        return frame.dropna(subset=['market_cap'])
+
+    def extremes(self):
+        """
+        Highest and lowest concentration and each company's market cap range,
+        the same answers as the Athena extremes queries.
+        """
+        concentration = self.metrics['mag7_pct_of_sp500']
+        result = {}
+        if len(concentration) and not np.all(np.isnan(concentration)):
+            high, low = np.nanargmax(concentration), np.nanargmin(concentration)
+            result['mag7_pct_of_sp500'] = {
+                'highest': {'trading_date': str(self.dates[high]), 'value': float(concentration[high])},
+                'lowest': {'trading_date': str(self.dates[low]), 'value': float(concentration[low])}
+            }
+            deepest = np.nanargmin(self.metrics['mag7_drawdown'])
+            result['max_mag7_drawdown'] = {
+                'trading_date': str(self.dates[deepest]),
+                'value': float(self.metrics['mag7_drawdown'][deepest])
+            }
+
+        result['market_cap'] = {}
+        for column, ticker in enumerate(self.tickers):
+            caps = self.market_caps[:, column]
+            if np.all(np.isnan(caps)):
+                continue
+            high, low = np.nanargmax(caps), np.nanargmin(caps)
+            result['market_cap'][ticker] = {
+                'highest': {'trading_date': str(self.dates[high]), 'value': float(caps[high])},
+                'lowest': {'trading_date': str(self.dates[low]), 'value': float(caps[low])},
+                'max_drawdown': float(np.nanmin(self.metrics['company_drawdown'][:, column]))
+            }
+        return result
+
+    def save(self, path):
+        """
+        Stores inputs and computed metrics so later runs can update incrementally.
+        """
+        np.savez_compressed(
+            path,
+            tickers=np.array(self.tickers),
+            window=self.window,
+            dates=self.dates,
+            market_caps=self.market_caps,
+            sp500_totals=self.sp500_totals,
+            version_dates=np.array(list(self.versions), dtype=str),
+            versions=np.array(list(self.versions.values()), dtype=str),
+            **{f'metric_{name}': values for name, values in self.metrics.items()}
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as state:
+            analytics = cls(tickers=state['tickers'].tolist(), window=int(state['window']))
+            analytics.dates = state['dates']
+            analytics.market_caps = state['market_caps']
+            analytics.sp500_totals = state['sp500_totals']
+            analytics.metrics = {
+                name[len('metric_'):]: state[name] for name in state.files if name.startswith('metric_')
+            }
+            # States saved without versions reload every date once
+            if 'versions' in state.files:
+                analytics.versions = dict(zip(state['version_dates'].tolist(), state['versions'].tolist()))
+        return analytics
+
+    def changed_dates(self, partitions):
+        """
+        Returns the dates whose document is new or has changed since it was loaded.
+
+        Args:
+            partitions (dict): {trading_date: version} from list_*_partitions
+        """
+        return sorted(
+            trading_date for trading_date, version in partitions.items()
+            if self.versions.get(trading_date) != version
+        )
+
+    def update_from_s3(self, s3, bucket):
+        """
+        Loads and computes only the days added or rewritten since the last update.
+
+        Returns:
+            int: Number of rows computed
+        """
+        partitions = list_s3_partitions(s3, bucket)
+        dates = self.changed_dates(partitions)
+        computed = self.add_documents(load_s3_documents(s3, bucket, dates))
+        self.versions.update((trading_date, partitions[trading_date]) for trading_date in dates)
+        return computed
+
+    def update_from_directory(self, data_dir):
+        partitions = list_directory_partitions(data_dir)
+        dates = self.changed_dates(partitions)
+        computed = self.add_documents(load_directory_documents(data_dir, dates))
+        self.versions.update((trading_date, partitions[trading_date]) for trading_date in dates)
+        return computed
+
+def main():
+    parser = argparse.ArgumentParser(description='Compute concentration analytics over all collected days.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--data-dir', help='Local copy of the data bucket (e.g. a backfill --output-dir)')
+    source.add_argument('--bucket', help='S3 data bucket')
+    parser.add_argument('--state', help='Saved state file; only new or rewritten days are loaded')
+    parser.add_argument('--window', type=int, default=ROLLING_WINDOW, help='Rolling window in trading days')
+    parser.add_argument('--output-dir', help='Write daily.csv and companies.csv here')
+    args = parser.parse_args()
+
+    if args.state and os.path.exists(args.state):
+        analytics = ConcentrationAnalytics.load(args.state)
+        print(f"Loaded state through {analytics.last_date}")
+    else:
+        analytics = ConcentrationAnalytics(window=args.window)
+
+    if args.bucket:
+        import boto3
+        added = analytics.update_from_s3(boto3.client('s3'), args.bucket)
+    else:
+        added = analytics.update_from_directory(args.data_dir)
+    print(f"Computed {added} rows; {len(analytics.dates)} trading dates through {analytics.last_date}")
+
+    if not len(analytics.dates):
+        return
+
+    if args.state:
+        analytics.save(args.state)
+
+    print(json.dumps(analytics.extremes(), indent=2))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        analytics.daily_frame().to_csv(os.path.join(args.output_dir, 'daily.csv'))
+        analytics.company_frame().to_csv(os.path.join(args.output_dir, 'companies.csv'))
+        print(f"Wrote daily.csv and companies.csv to {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Lists and reads the stored day documents for the analytics tools.
+
+Standard library only, so market_data_db.py runs without the NumPy and
+pandas stack concentration_analytics.py needs.
+"""
+import glob
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+RAW_PREFIX = 'raw/magnificent7/'
+PARTITION_DATE = re.compile(r'trading_date=(\d{4}-\d{2}-\d{2})')
+
+def list_s3_partitions(s3, bucket):
+    """
+    Returns {trading_date: ETag} for every stored day document.
+    """
+    partitions = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=RAW_PREFIX + 'trading_date='):
+        for item in page.get('Contents', []):
+            match = PARTITION_DATE.search(item['Key'])
+            if match and item['Key'].endswith('/market_data.json'):
+                # LocalS3 listings have no ETag, so fall back to the size
+                partitions[match.group(1)] = item.get('ETag') or str(item.get('Size'))
+    return partitions
+
+def load_s3_documents(s3, bucket, dates, max_workers=16):
+    """
+    Reads the day documents for the given dates in parallel.
+    """
+    def read(trading_date):
+        key = f"{RAW_PREFIX}trading_date={trading_date}/market_data.json"
+        return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(read, dates))
+
+def list_directory_partitions(data_dir):
+    """
+    Returns {trading_date: modification time and size} for a local copy of the bucket.
+    """
+    partitions = {}
+    pattern = os.path.join(data_dir, *RAW_PREFIX.strip('/').split('/'), 'trading_date=*', 'market_data.json')
+    for path in glob.glob(pattern):
+        match = PARTITION_DATE.search(path)
+        if match:
+            stat = os.stat(path)
+            partitions[match.group(1)] = f"{stat.st_mtime_ns}:{stat.st_size}"
+    return partitions
+
+def load_directory_documents(data_dir, dates):
+    documents = []
+    for trading_date in dates:
+        path = os.path.join(data_dir, *RAW_PREFIX.strip('/').split('/'), f'trading_date={trading_date}', 'market_data.json')
+        with open(path, 'r') as document_file:
+            documents.append(json.load(document_file))
+    return documents
@@ -0,0 +1,300 @@
+"""
+Local SQLite copy of the market_data tables for running the Athena queries.
+
+Flattens each stored market_data.json into the Redshift tables from
+table_definitions.ipynb (company_details, daily_trading,
+magnificent7_metrics, concentration_metrics, failed_collections), the same
+rows the Glue jobs produce. The database is attached as `market_data`, so the
+files in services/athena run unchanged, in milliseconds and without scanning S3.
+
+Ingestion is incremental per trading_date partition: the ETag (S3) or
+modification time (local directory) of each day's document is stored, and
+only new or rewritten partitions, such as repaired days, are reloaded.
+
+Usage:
+    python market_data_db.py --data-dir ../local/market-data --db market_data.db
+    python market_data_db.py --bucket my-bucket --db market_data.db --query ../athena/min_max_concentration.sql
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import time
+
+from day_documents import (
+    list_directory_partitions,
+    list_s3_partitions,
+    load_directory_documents,
+    load_s3_documents
+)
+
+ATHENA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'athena')
+
+# Redshift column types mapped to SQLite; VARCHAR and DOUBLE PRECISION keep
+# text and real affinity, so comparisons behave as they do in Athena.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS market_data.company_details (
+    trading_date VARCHAR(10),
+    ticker VARCHAR(10),
+    company_name VARCHAR(255),
+    market_cap DOUBLE PRECISION,
+    shares_outstanding DOUBLE PRECISION,
+    currency VARCHAR(3),
+    description VARCHAR(1024),
+    PRIMARY KEY (trading_date, ticker)
+);
+CREATE TABLE IF NOT EXISTS market_data.daily_trading (
+    trading_date VARCHAR(10),
+    ticker VARCHAR(10),
+    open_price DOUBLE PRECISION,
+    high_price DOUBLE PRECISION,
+    low_price DOUBLE PRECISION,
+    close_price DOUBLE PRECISION,
+    volume BIGINT,
+    vwap DOUBLE PRECISION,
+    PRIMARY KEY (trading_date, ticker)
+);
+CREATE TABLE IF NOT EXISTS market_data.magnificent7_metrics (
+    trading_date VARCHAR(10),
+    ticker VARCHAR(10),
+    market_cap DOUBLE PRECISION,
+    pct_of_mag7 DOUBLE PRECISION,
+    pct_of_sp500 DOUBLE PRECISION,
+    ranking INTEGER,
+    PRIMARY KEY (trading_date, ticker)
+);
+CREATE TABLE IF NOT EXISTS market_data.concentration_metrics (
+    trading_date VARCHAR(10) PRIMARY KEY,
+    total_mag7_market_cap DOUBLE PRECISION,
+    sp500_total_market_cap DOUBLE PRECISION,
+    mag7_pct_of_sp500 DOUBLE PRECISION,
+    mag7_companies_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS market_data.failed_collections (
+    trading_date VARCHAR(10),
+    ticker VARCHAR(10),
+    reason TEXT
+);
+CREATE INDEX IF NOT EXISTS market_data.failed_collections_date ON failed_collections (trading_date);
+CREATE INDEX IF NOT EXISTS market_data.company_details_ticker ON company_details (ticker, trading_date);
+CREATE INDEX IF NOT EXISTS market_data.concentration_metrics_pct ON concentration_metrics (mag7_pct_of_sp500);
+CREATE TABLE IF NOT EXISTS market_data.ingested_partitions (
+    trading_date VARCHAR(10) PRIMARY KEY,
+    version TEXT,
+    ingested_at TEXT
+);
+"""
+
+TABLES = ('company_details', 'daily_trading', 'magnificent7_metrics', 'concentration_metrics', 'failed_collections')
+
+def flatten_document(document):
+    """
+    Flattens one day's document into rows for each table.
+
+    Follows the Glue jobs in services/glue: companies become company_details
+    and daily_trading rows, rankings.by_market_cap becomes
+    magnificent7_metrics, and each day gets one failed_collections row
+    describing its collection status.
+
+    Args:
+        document (dict): market_data.json for one trading date
+
+    Returns:
+        dict: Lists of row tuples keyed by table name, in column order
+    """
+    trading_date = document['trading_date']
+    tables = {name: [] for name in TABLES}
+
+    for ticker, company in document.get('companies', {}).items():
+        tables['company_details'].append((
+            trading_date,
+            ticker,
+            company.get('name'),
+            company.get('market_cap'),
+            company.get('shares_outstanding'),
+            company.get('currency'),
+            company.get('description')
+        ))
+
+        trading_data = company.get('trading_data') or {}
+        if trading_data.get('close_price') is not None:
+            tables['daily_trading'].append((
+                trading_date,
+                ticker,
+                trading_data.get('open_price'),
+                trading_data.get('high_price'),
+                trading_data.get('low_price'),
+                trading_data.get('close_price'),
+                trading_data.get('volume'),
+                trading_data.get('vwap')
+            ))
+
+    rankings = (document.get('rankings') or {}).get('by_market_cap', [])
+    for ranking, company in enumerate(rankings, start=1):
+        tables['magnificent7_metrics'].append((
+            trading_date,
+            company['ticker'],
+            company.get('market_cap'),
+            company.get('pct_of_mag7'),
+            company.get('pct_of_sp500'),
+            ranking
+        ))
+
+    metrics = document.get('concentration_metrics') or {}
+    if metrics.get('total_mag7_market_cap') is not None:
+        tables['concentration_metrics'].append((
+            trading_date,
+            metrics['total_mag7_market_cap'],
+            metrics.get('sp500_total_market_cap'),
+            metrics.get('mag7_pct_of_sp500'),
+            metrics.get('mag7_companies_count')
+        ))
+
+    failed_count = (document.get('sp500_details') or {}).get('failed_count', 0)
+    if failed_count == 0 and metrics.get('total_mag7_market_cap') is None:
+        reason = 'Market Holiday'
+    elif failed_count == 0:
+        reason = 'No collection failures'
+    else:
+        reason = 'Failed collections present'
+    tables['failed_collections'].append((trading_date, None, reason))
+
+    return tables
+
+class MarketDataDB:
+    """
+    SQLite database holding the market_data tables.
+
+    Args:
+        path (str): Database file, or ':memory:' for a throwaway database in tests
+    """
+    def __init__(self, path=':memory:'):
+        self.path = path
+        # The tables live in an attached database named market_data, so
+        # schema-qualified names such as market_data.company_details resolve
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute('ATTACH DATABASE ? AS market_data', (path,))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def ingested_versions(self):
+        return dict(self.connection.execute(
+            'SELECT trading_date, version FROM market_data.ingested_partitions'
+        ))
+
+    def changed_partitions(self, partitions):
+        """
+        Returns the dates whose document is new or has changed since it was ingested.
+
+        Args:
+            partitions (dict): {trading_date: version} from list_*_partitions
+        """
+        ingested = self.ingested_versions()
+        return sorted(
+            trading_date for trading_date, version in partitions.items()
+            if ingested.get(trading_date) != version
+        )
+
+    def ingest(self, documents, versions):
+        """
+        Replaces the rows of each document's trading_date in one transaction.
+
+        Args:
+            documents (list): Day documents
+            versions (dict): {trading_date: version} recorded for each document
+
+        Returns:
+            int: Partitions ingested
+        """
+        ingested_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+        with self.connection:
+            for document in documents:
+                trading_date = document['trading_date']
+                for table_name, rows in flatten_document(document).items():
+                    self.connection.execute(
+                        f'DELETE FROM market_data.{table_name} WHERE trading_date = ?', (trading_date,)
+                    )
+                    if rows:
+                        placeholders = ', '.join('?' * len(rows[0]))
+                        self.connection.executemany(
+                            f'INSERT INTO market_data.{table_name} VALUES ({placeholders})', rows
+                        )
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO market_data.ingested_partitions VALUES (?, ?, ?)',
+                    (trading_date, versions.get(trading_date), ingested_at)
+                )
+
+        return len(documents)
+
+    def update_from_s3(self, s3, bucket):
+        """
+        Ingests only the partitions added or rewritten since the last update.
+
+        Returns:
+            int: Partitions ingested
+        """
+        partitions = list_s3_partitions(s3, bucket)
+        dates = self.changed_partitions(partitions)
+        return self.ingest(load_s3_documents(s3, bucket, dates), partitions)
+
+    def update_from_directory(self, data_dir):
+        partitions = list_directory_partitions(data_dir)
+        dates = self.changed_partitions(partitions)
+        return self.ingest(load_directory_documents(data_dir, dates), partitions)
+
+    def query(self, sql, parameters=()):
+        """
+        Runs one SQL statement.
+
+        Returns:
+            tuple: (column names, list of row tuples)
+        """
+        cursor = self.connection.execute(sql.strip().rstrip(';'), parameters)
+        columns = [column[0] for column in cursor.description or []]
+        return columns, cursor.fetchall()
+
+    def run_file(self, path):
+        with open(path, 'r') as sql_file:
+            return self.query(sql_file.read())
+
+def main():
+    parser = argparse.ArgumentParser(description='Load collected days into SQLite and run the Athena queries locally.')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--data-dir', help='Local copy of the data bucket (e.g. a backfill --output-dir)')
+    source.add_argument('--bucket', help='S3 data bucket')
+    parser.add_argument('--db', default='market_data.db', help='SQLite database file, updated in place')
+    parser.add_argument('--query', action='append', help='SQL file to run (repeatable, defaults to services/athena/*.sql)')
+    args = parser.parse_args()
+
+    db = MarketDataDB(args.db)
+
+    started = time.perf_counter()
+    if args.bucket:
+        import boto3
+        ingested = db.update_from_s3(boto3.client('s3'), args.bucket)
+    elif args.data_dir:
+        ingested = db.update_from_directory(args.data_dir)
+    else:
+        ingested = 0
+    print(f"Ingested {ingested} changed partitions in {time.perf_counter() - started:.2f}s; "
+          f"{len(db.ingested_versions())} trading dates in {args.db}")
+
+    for path in args.query or sorted(glob.glob(os.path.join(ATHENA_DIR, '*.sql'))):
+        started = time.perf_counter()
+        columns, rows = db.run_file(path)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        print(f"\n{os.path.basename(path)} ({len(rows)} rows, {elapsed_ms:.1f} ms)")
+        print(' | '.join(columns))
+        for row in rows[:20]:
+            print(' | '.join('' if value is None else str(value) for value in row))
+        if len(rows) > 20:
+            print(f"... {len(rows) - 20} more rows")
+
+    db.close()
+
+if __name__ == '__main__':
+    main()
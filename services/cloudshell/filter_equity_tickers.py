@@ -1,34 +1,413 @@
-import pandas as pd
+"""
+Builds the collector's universe index from ETF holdings files.
 
-# File path for the input CSV
-file_path = 'IVV_holdings.csv'
+Each holdings CSV (iShares IVV, SPDR SPY, Invesco QQQ, ...) is streamed once:
+the preamble is scanned for the "as of" date until the header row is found,
+then equity rows are kept with their weights. Funds are grouped by the index
+they track, and each universe gets its own index file: S&P 500 funds update
+universe_index.json, which the collector loads, and others such as QQQ update
+universe_index_<universe>.json next to it. Within a universe the constituents
+of the most recent files are merged into one snapshot, which is added to the
+index as a new membership version, and the changes against the previous
+snapshot (added and removed tickers, weight moves) are written next to it.
 
-# Read the raw content of the file to inspect structure
-with open(file_path, 'r') as file:
-    raw_content = file.readlines()
+The fund is taken from a FUND=path argument, or from the file name prefix
+(IVV_holdings.csv) when none is given.
 
-# Identify the start of actual data (header line)
-header_line_index = next(
-    (index for index, line in enumerate(raw_content) if "Ticker,Name," in line), None
+Membership before the first snapshot can be seeded with --changes, a CSV of
+dated S&P 500 additions and removals; without it, the index has no record of
+constituents removed before its first snapshot.
+
+Usage:
+    python3 filter_equity_tickers.py IVV_holdings.csv
+    python3 filter_equity_tickers.py --changes sp500_changes.csv --index universe_index.json
+    python3 filter_equity_tickers.py IVV=IVV_holdings.csv SPY=holdings-daily-us-en-spy.csv QQQ=QQQ.csv \
+        --index universe_index.json --bucket [S3 Bucket Name] --key reference/universe_index.json
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+# universe_index.py is uploaded next to this script in CloudShell; in the
+# repository it lives with the collector
+COLLECTOR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'lambda', 'magnificent7-historical-data-collector'
 )
+sys.path.append(COLLECTOR_DIR)
+
+from universe_index import UniverseIndex
+
+# Column names used by the different fund families
+TICKER_COLUMNS = ('Ticker', 'Holding Ticker', 'Symbol')
+WEIGHT_COLUMNS = ('Weight (%)', 'Weight', 'Weight %', '% of Net Assets')
+ASSET_CLASS_COLUMNS = ('Asset Class', 'Security Type')
+DATE_COLUMNS = ('Date', 'As of Date')
+
+DATE_FORMATS = ('%b %d, %Y', '%d-%b-%Y', '%m/%d/%Y', '%Y-%m-%d', '%B %d, %Y')
+
+# Share classes are written without a separator by iShares; Polygon uses a dot
+SYMBOL_OVERRIDES = {'BRKB': 'BRK.B', 'BFB': 'BF.B'}
+
+# Index tracked by each known fund. Funds of the same index are merged into
+# one universe; any other fund is a universe of its own.
+TRACKED_INDEX = {
+    'IVV': 'sp500', 'SPY': 'sp500', 'VOO': 'sp500', 'SPLG': 'sp500',
+    'QQQ': 'nasdaq100', 'QQQM': 'nasdaq100'
+}
+
+# The universe the collector's universe_index.json holds
+COLLECTOR_UNIVERSE = 'sp500'
+
+# Weight moves, in percentage points, reported in the diff
+WEIGHT_CHANGE_THRESHOLD = 0.05
+
+def parse_date(text):
+    """
+    Parses a holdings date such as "Dec 06, 2024" or "As of 06-Dec-2024".
+
+    Returns:
+        str: Date in YYYY-MM-DD format, or None if the text is not a date
+    """
+    text = re.sub(r'^\s*as of:?\s*', '', text.strip(), flags=re.IGNORECASE)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def normalize_symbol(ticker):
+    ticker = ticker.strip().upper()
+    return SYMBOL_OVERRIDES.get(ticker, re.sub(r'[/\s-]+', '.', ticker))
+
+def parse_weight(value):
+    try:
+        return float(value.replace(',', '').replace('%', ''))
+    except (AttributeError, ValueError):
+        return None
+
+def find_column(header, candidates):
+    for name in candidates:
+        if name in header:
+            return header.index(name)
+    return None
+
+def parse_holdings_argument(argument):
+    """
+    Splits a FUND=path argument; a bare path uses its file name prefix.
+
+    Returns:
+        tuple: (fund, path)
+    """
+    fund, separator, path = argument.partition('=')
+    if separator and fund and not os.path.exists(argument):
+        return fund.strip().upper(), path
+    return os.path.basename(argument).split('_')[0].split('.')[0].upper(), argument
+
+def read_holdings(path, fund):
+    """
+    Streams one holdings file and returns its equity constituents.
+
+    Rows before the header are checked for the fund's "as of" date; the
+    header is the first row with a ticker column. Rows after it are read
+    until the holdings table ends, so the disclaimer footer is never parsed.
+
+    Args:
+        path (str): Holdings CSV
+        fund (str): Fund ticker, e.g. IVV
+
+    Returns:
+        dict: {'fund', 'as_of', 'weights': {ticker: weight}} with tickers in
+            file order, which is by weight
+    """
+    as_of = None
+    header = None
+    weights = {}
+
+    # utf-8-sig drops the byte order mark iShares files start with
+    with open(path, 'r', encoding='utf-8-sig', newline='') as holdings_file:
+        for row in csv.reader(holdings_file):
+            cells = [cell.strip() for cell in row]
+
+            if header is None:
+                if find_column(cells, TICKER_COLUMNS) is not None:
+                    header = cells
+                    ticker_column = find_column(header, TICKER_COLUMNS)
+                    weight_column = find_column(header, WEIGHT_COLUMNS)
+                    asset_class_column = find_column(header, ASSET_CLASS_COLUMNS)
+                    date_column = find_column(header, DATE_COLUMNS)
+                elif as_of is None:
+                    as_of = next((parse_date(cell) for cell in cells if parse_date(cell)), None)
+                continue
+
+            # A blank or short row ends the holdings table
+            if len(cells) <= ticker_column or not any(cells):
+                break
+
+            if asset_class_column is not None and cells[asset_class_column] not in ('Equity', 'Common Stock'):
+                continue
+            if not cells[ticker_column] or cells[ticker_column] == '-':
+                continue
+
+            if as_of is None and date_column is not None:
+                as_of = parse_date(cells[date_column])
+
+            ticker = normalize_symbol(cells[ticker_column])
+            weight = parse_weight(cells[weight_column]) if weight_column is not None else None
+            weights[ticker] = (weights.get(ticker) or 0) + (weight or 0)
+
+    if header is None:
+        raise ValueError(f"No header row with a ticker column found in {path}")
+
+    print(f"{fund}: {len(weights)} equity holdings as of {as_of or 'unknown date'}")
+    return {'fund': fund, 'as_of': as_of, 'weights': weights}
+
+def merge_holdings(holdings):
+    """
+    Combines several funds tracking the same index into one weighted snapshot.
+
+    Only the files as of the latest date are merged; an older export is
+    skipped, so it can neither bring back removed constituents nor hide new
+    ones. The snapshot is the union of the remaining funds, and a ticker's
+    weight is its average over the funds that hold it.
+
+    Returns:
+        tuple: (snapshot date, {ticker: weight} ordered by weight,
+            {fund: as_of date} of the funds merged)
+    """
+    dates = {fund['as_of'] for fund in holdings if fund['as_of']}
+    latest = max(dates) if dates else None
+
+    current = []
+    for fund in holdings:
+        if fund['as_of'] and fund['as_of'] < latest:
+            print(f"Warning: skipping {fund['fund']} holdings as of {fund['as_of']}, older than {latest}")
+        else:
+            current.append(fund)
+
+    totals = {}
+    counts = {}
+    for fund in current:
+        for ticker, weight in fund['weights'].items():
+            totals[ticker] = totals.get(ticker, 0) + weight
+            counts[ticker] = counts.get(ticker, 0) + 1
+
+    merged = {ticker: round(totals[ticker] / counts[ticker], 4) for ticker in totals}
+    ordered = dict(sorted(merged.items(), key=lambda item: item[1], reverse=True))
+    return latest, ordered, {fund['fund']: fund['as_of'] for fund in current}
+
+def diff_snapshots(index, snapshot_date, weights):
+    """
+    Compares a new snapshot with the latest one in the index.
+
+    Returns:
+        dict: Added and removed tickers and weight moves above
+            WEIGHT_CHANGE_THRESHOLD, largest first
+    """
+    previous = index.current_members()
+    previous_set = set(previous)
+    previous_weights = index.weights
+
+    weight_changes = {}
+    for ticker, weight in weights.items():
+        if ticker in previous_weights and abs(weight - previous_weights[ticker]) >= WEIGHT_CHANGE_THRESHOLD:
+            weight_changes[ticker] = {
+                'from': previous_weights[ticker],
+                'to': weight,
+                'change': round(weight - previous_weights[ticker], 4)
+            }
+
+    return {
+        'from_snapshot': index.snapshots[-1] if index.snapshots else None,
+        'to_snapshot': snapshot_date,
+        'added': [ticker for ticker in weights if ticker not in previous_set],
+        'removed': [ticker for ticker in previous if ticker not in weights],
+        'weight_changes': dict(sorted(
+            weight_changes.items(), key=lambda item: abs(item[1]['change']), reverse=True
+        )),
+        'constituents': len(weights)
+    }
+
+def format_index(document):
+    """
+    Serializes the index with one member per line, so refreshes show up as
+    small line diffs.
+    """
+    lines = []
+    for key, value in document.items():
+        if isinstance(value, dict) and value:
+            entries = ',\n'.join(f"    {json.dumps(name)}: {json.dumps(entry)}" for name, entry in value.items())
+            lines.append(f"  {json.dumps(key)}: {{\n{entries}\n  }}")
+        else:
+            lines.append(f"  {json.dumps(key)}: {json.dumps(value)}")
+    return '{\n' + ',\n'.join(lines) + '\n}\n'
+
+def universe_paths(universe, args):
+    """
+    Returns the index file, output name suffix and S3 key for a universe.
+
+    The collector's universe keeps the paths given on the command line;
+    others are written next to them with the universe name appended.
+    """
+    if universe == COLLECTOR_UNIVERSE:
+        return args.index, '', args.key
+    index_root, index_ext = os.path.splitext(args.index)
+    key_root, key_ext = os.path.splitext(args.key)
+    return f"{index_root}_{universe}{index_ext}", f"_{universe}", f"{key_root}_{universe}{key_ext}"
+
+def update_universe(universe, holdings, args):
+    """
+    Adds one universe's merged holdings to its index as a new snapshot and
+    writes the diff, ticker list and optional S3 copies.
+
+    Args:
+        universe (str): Tracked index, e.g. sp500
+        holdings (list): read_holdings results for the universe's funds
+        args: Parsed command line arguments
+    """
+    index_path, suffix, key = universe_paths(universe, args)
+
+    snapshot_date, weights, funds = merge_holdings(holdings)
+    snapshot_date = args.date or snapshot_date
+    if not snapshot_date:
+        raise ValueError(f"No holdings date found in the {universe} files, pass --date")
+
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as index_file:
+            index = UniverseIndex.from_dict(json.load(index_file))
+    else:
+        index = UniverseIndex.from_snapshots({})
+
+    if index.snapshots and snapshot_date <= index.snapshots[-1]:
+        print(f"{index_path} already includes holdings as of {index.snapshots[-1]}, nothing to do")
+        return
+
+    diff = diff_snapshots(index, snapshot_date, weights)
+    diff['funds'] = funds
+    index.add_snapshot(snapshot_date, list(weights), weights)
+
+    body = format_index(index.to_dict())
+    with open(index_path, 'w') as index_file:
+        index_file.write(body)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    diff_path = os.path.join(args.output_dir, f'universe_diff{suffix}_{snapshot_date}.json')
+    with open(diff_path, 'w') as diff_file:
+        json.dump(diff, diff_file, indent=2)
+
+    with open(os.path.join(args.output_dir, f'filtered_tickers{suffix}.csv'), 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Ticker', 'Weight'])
+        writer.writerows(weights.items())
+
+    print(f"{universe} snapshot {snapshot_date} from {', '.join(funds)}: {diff['constituents']} constituents, "
+          f"{len(diff['added'])} added, {len(diff['removed'])} removed, "
+          f"{len(diff['weight_changes'])} weight changes")
+    # The first snapshot adds every ticker, which is not worth listing
+    if diff['added'] and diff['from_snapshot']:
+        print(f"Added: {', '.join(diff['added'])}")
+    if diff['removed']:
+        print(f"Removed: {', '.join(diff['removed'])}")
+    print(f"Wrote {index_path} and {diff_path}")
+
+    if args.bucket:
+        import boto3
+        s3 = boto3.client('s3')
+        s3.put_object(Bucket=args.bucket, Key=key, Body=body)
+
+        # Every version is also kept under its snapshot date
+        archive_prefix = f"{os.path.dirname(key) or 'reference'}/universe{suffix}/snapshot={snapshot_date}"
+        s3.put_object(Bucket=args.bucket, Key=f"{archive_prefix}/universe_index.json", Body=body)
+        s3.put_object(Bucket=args.bucket, Key=f"{archive_prefix}/diff.json", Body=json.dumps(diff, indent=2))
+        print(f"Uploaded s3://{args.bucket}/{key} and {archive_prefix}/")
+
+def read_changes(path):
+    """
+    Reads dated index changes, one addition and/or removal per row, such as
+    the S&P 500 change history table exported to CSV.
+
+    Returns:
+        list: {'date', 'added', 'removed'} entries for UniverseIndex.add_changes
+    """
+    changes = {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as changes_file:
+        for row in csv.DictReader(changes_file):
+            row = {name.strip().lower(): (value or '').strip() for name, value in row.items() if name}
+            change_date = parse_date(row.get('date', ''))
+            if not change_date:
+                continue
+            change = changes.setdefault(change_date, {'date': change_date, 'added': [], 'removed': []})
+            for column in ('added', 'removed'):
+                ticker = row.get(column) or row.get(f'{column} ticker')
+                if ticker:
+                    change[column].append(normalize_symbol(ticker))
+    return list(changes.values())
+
+def seed_changes(path, args):
+    """
+    Applies dated additions and removals before the first snapshot to the
+    collector's index, so backfills before it use the members of the time.
+    """
+    with open(args.index, 'r') as index_file:
+        index = UniverseIndex.from_dict(json.load(index_file))
+
+    changes = read_changes(path)
+    applied = index.add_changes(changes)
+    print(f"Applied {applied} index changes before {index.snapshots[0]} to {args.index}")
+    if not applied:
+        return
+
+    # Applying the file again must change nothing, or a rerun would
+    # duplicate intervals; check on a copy before writing
+    reapplied = UniverseIndex.from_dict(json.loads(json.dumps(index.to_dict()))).add_changes(changes)
+    if reapplied:
+        raise ValueError(f"{path} applied {reapplied} changes again on a repeat run, index not written")
+
+    body = format_index(index.to_dict())
+    with open(args.index, 'w') as index_file:
+        index_file.write(body)
+
+    if args.bucket:
+        import boto3
+        boto3.client('s3').put_object(Bucket=args.bucket, Key=args.key, Body=body)
+        print(f"Uploaded s3://{args.bucket}/{args.key}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Add ETF holdings snapshots to the collector universe index.')
+    parser.add_argument('holdings', nargs='*',
+                        help='Holdings CSV files as FUND=path or path, e.g. IVV_holdings.csv SPY=spy.csv QQQ=qqq.csv')
+    parser.add_argument('--index', default='universe_index.json',
+                        help='S&P 500 universe index to update (created if missing); other universes are written next to it')
+    parser.add_argument('--date', help='Snapshot date (YYYY-MM-DD) if the files do not state one')
+    parser.add_argument('--output-dir', default='.', help='Directory for the diff and filtered_tickers.csv')
+    parser.add_argument('--bucket', help='Also upload the index and diff to this S3 bucket')
+    parser.add_argument('--key', default='reference/universe_index.json', help='S3 key the collector loads (UNIVERSE_INDEX_KEY)')
+    parser.add_argument('--changes', help='CSV of dated S&P 500 additions and removals (Date, Added, Removed) '
+                                          'to seed membership before the first snapshot')
+    args = parser.parse_args()
+    if not args.holdings and not args.changes:
+        parser.error('Pass holdings files, --changes or both')
+
+    universes = {}
+    for argument in args.holdings:
+        fund, path = parse_holdings_argument(argument)
+        universes.setdefault(TRACKED_INDEX.get(fund, fund.lower()), []).append(read_holdings(path, fund))
+
+    for universe, holdings in universes.items():
+        try:
+            update_universe(universe, holdings, args)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.changes:
+        try:
+            seed_changes(args.changes, args)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
 
-# Load the actual data into a DataFrame, skipping unnecessary lines
-if header_line_index is not None:
-    cleaned_data = pd.read_csv(file_path, skiprows=header_line_index)
-
-    # Filter the data: keep only rows where 'Asset Class' is 'Equity'
-    # and extract the 'Ticker' column
-    if 'Asset Class' in cleaned_data.columns and 'Ticker' in cleaned_data.columns:
-        filtered_data = cleaned_data[cleaned_data['Asset Class'] == 'Equity']['Ticker']
-
-        # Save the cleaned data to a new CSV file
-        output_csv_path = 'filtered_tickers.csv'
-        filtered_data.to_csv(output_csv_path, index=False)
-
-        # Save the tickers as a Python array in a .py file
-        tickers_list = filtered_data.tolist()
-        output_py_path = 'tickers_array.py'
-        with open(output_py_path, 'w') as py_file:
-            py_file.write(f"tickers = {tickers_list}")
-else:
-    print("Header line with expected columns was not found in the file.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
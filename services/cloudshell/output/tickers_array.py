@@ -1 +0,0 @@
-tickers = ['AAPL', 'NVDA', 'MSFT', 'AMZN', 'META', 'TSLA', 'GOOGL', 'BRKB', 'GOOG', 'AVGO', 'JPM', 'LLY', 'V', 'UNH', 'XOM', 'COST', 'MA', 'HD', 'WMT', 'PG', 'NFLX', 'JNJ', 'CRM', 'BAC', 'ABBV', 'ORCL', 'CVX', 'MRK', 'WFC', 'ADBE', 'KO', 'CSCO', 'NOW', 'ACN', 'AMD', 'IBM', 'PEP', 'LIN', 'MCD', 'DIS', 'PM', 'TMO', 'ABT', 'ISRG', 'CAT', 'GE', 'GS', 'INTU', 'VZ', 'BKNG', 'QCOM', 'TXN', 'T', 'AXP', 'CMCSA', 'SPGI', 'MS', 'RTX', 'LOW', 'NEE', 'PLTR', 'PGR', 'DHR', 'ETN', 'HON', 'AMGN', 'PFE', 'BLK', 'AMAT', 'TJX', 'UNP', 'UBER', 'C', 'BX', 'COP', 'BSX', 'SYK', 'PANW', 'ADP', 'SCHW', 'BMY', 'TMUS', 'FI', 'VRTX', 'GILD', 'DE', 'SBUX', 'BA', 'MU', 'ANET', 'MMC', 'LMT', 'ADI', 'MDT', 'KKR', 'CB', 'PLD', 'LRCX', 'MO', 'AMT', 'GEV', 'NKE', 'EQIX', 'TT', 'SO', 'UPS', 'PYPL', 'CMG', 'ICE', 'PH', 'APH', 'SHW', 'INTC', 'CI', 'ELV', 'KLAC', 'DUK', 'CME', 'CRWD', 'CDNS', 'MDLZ', 'PNC', 'REGN', 'AON', 'MSI', 'USB', 'WM', 'ZTS', 'CEG', 'SNPS', 'MCK', 'MCO', 'CL', 'CTAS', 'WELL', 'EMR', 'ITW', 'MMM', 'ORLY', 'EOG', 'TDG', 'COF', 'APD', 'GD', 'CVS', 'WMB', 'MAR', 'CSX', 'ADSK', 'NOC', 'AJG', 'HLT', 'OKE', 'BDX', 'ECL', 'TFC', 'FDX', 'FTNT', 'CARR', 'TGT', 'RCL', 'PCAR', 'FCX', 'ABNB', 'GM', 'TRV', 'BK', 'HCA', 'DLR', 'ROP', 'NSC', 'FICO', 'SLB', 'URI', 'SRE', 'AZO', 'SPG', 'JCI', 'NXPI', 'AMP', 'VST', 'CPRT', 'AFL', 'PSX', 'ALL', 'KMI', 'GWW', 'PSA', 'ROST', 'CMI', 'AEP', 'MPC', 'MET', 'AXON', 'PWR', 'O', 'AIG', 'MSCI', 'HWM', 'NEM', 'D', 'FIS', 'DHI', 'FAST', 'TEL', 'LULU', 'PAYX', 'KMB', 'PRU', 'DFS', 'PEG', 'LHX', 'PCG', 'AME', 'CCI', 'RSG', 'KVUE', 'EW', 'TRGP', 'COR', 'VLO', 'CBRE', 'DAL', 'IR', 'CTVA', 'F', 'BKR', 'A', 'VRSK', 'CTSH', 'EA', 'OTIS', 'IT', 'SYY', 'LEN', 'KR', 'HES', 'CHTR', 'XEL', 'YUM', 'ODFL', 'GLW', 'VMC', 'EXC', 'STZ', 'GEHC', 'MNST', 'KDP', 'ACGL', 'GIS', 'WAB', 'IDXX', 'MLM', 'DELL', 'RMD', 'HPQ', 'MTB', 'IRM', 'IQV', 'HIG', 'EXR', 'DD', 'HUM', 'NUE', 'GRMN', 'NDAQ', 'ROK', 'VICI', 'EFX', 'UAL', 'ED', 'WTW', 'EIX', 'ETR', 'AVB', 'OXY', 'FITB', 'MCHP', 'CSGP', 'FANG', 'DXCM', 'HPE', 'EBAY', 'TTWO', 'XYL', 'WEC', 'TSCO', 'DECK', 'RJF', 'ANSS', 'GPN', 'KEYS', 'CAH', 'CNC', 'DOW', 'STT', 'PPG', 'GDDY', 'MPWR', 'ON', 'NVR', 'DOV', 'FTV', 'TROW', 'BR', 'KHC', 'NTAP', 'SW', 'CCL', 'SYF', 'MTD', 'TYL', 'VLTO', 'PHM', 'CHD', 'BRO', 'HSY', 'AWK', 'EQT', 'HBAN', 'VTR', 'HAL', 'CPAY', 'TPL', 'EQR', 'DTE', 'HUBB', 'PPL', 'ADM', 'AEE', 'CINF', 'PTC', 'CDW', 'RF', 'WBD', 'EXPE', 'SBAC', 'WST', 'WDC', 'BIIB', 'WAT', 'WY', 'IFF', 'TDY', 'SMCI', 'ATO', 'ZBH', 'LDOS', 'DVN', 'NTRS', 'K', 'PKG', 'LYV', 'ES', 'CBOE', 'STE', 'ZBRA', 'CFG', 'FE', 'FSLR', 'STX', 'CLX', 'CNP', 'NRG', 'LUV', 'BLDR', 'ULTA', 'OMC', 'DRI', 'CMS', 'LYB', 'IP', 'COO', 'STLD', 'LH', 'MKC', 'TER', 'ESS', 'LVS', 'INVH', 'WRB', 'SNA', 'PODD', 'MAA', 'EL', 'CTRA', 'TRMB', 'FDS', 'PFG', 'DG', 'TSN', 'PNR', 'MAS', 'DGX', 'KEY', 'HOLX', 'IEX', 'BALL', 'BBY', 'MOH', 'J', 'GPC', 'KIM', 'GEN', 'EXPD', 'NI', 'ALGN', 'AVY', 'BAX', 'ARE', 'EG', 'DPZ', 'VRSN', 'CF', 'L', 'LNT', 'TXT', 'JBL', 'VTRS', 'APTV', 'DOC', 'MRNA', 'FFIV', 'AKAM', 'AMCR', 'JBHT', 'DLTR', 'EVRG', 'RVTY', 'TPR', 'POOL', 'SWKS', 'EPAM', 'ROL', 'NDSN', 'UDR', 'KMX', 'HST', 'CAG', 'SWK', 'CPT', 'JKHY', 'DAY', 'SJM', 'CHRW', 'ALB', 'ALLE', 'NCLH', 'INCY', 'REG', 'JNPR', 'BG', 'EMN', 'TECH', 'BXP', 'AIZ', 'UHS', 'PAYC', 'CTLT', 'LW', 'NWSA', 'IPG', 'GNRC', 'TAP', 'FOXA', 'PNW', 'ERIE', 'LKQ', 'CRL', 'ENPH', 'SOLV', 'HRL', 'GL', 'AES', 'HSIC', 'RL', 'MKTX', 'WYNN', 'AOS', 'TFX', 'HAS', 'FRT', 'MTCH', 'MGM', 'CPB', 'MOS', 'BFB', 'CZR', 'IVZ', 'APA', 'CE', 'BWA', 'DVA', 'HII', 'FMC', 'MHK', 'BEN', 'PARA', 'QRVO', 'WBA', 'FOX', 'NWS', 'AMTM']
\ No newline at end of file
@@ -0,0 +1,96 @@
+import json
+import os
+
+# Shared by both date generators and the local backfill runner. They only
+# emit dates that still need collecting, judged by the raw/ partitions and
+# the collector's manifests. boto3 is imported lazily so offline backfills
+# can pass local storage instead.
+
+# Where the collector keeps its manifests. collection_manifest.py imports
+# these, so the generators look for _SUCCESS markers in the same place the
+# collector writes them; set the same variables on all three functions.
+MANIFEST_PREFIX = os.environ.get('MANIFEST_PREFIX', 'manifests/magnificent7')
+MANIFEST_DIR = os.environ.get('MANIFEST_DIR')
+
+def list_partition_dates(s3, bucket, prefix):
+    """
+    Lists the trading dates that have objects under a trading_date= prefix.
+
+    Args:
+        s3: boto3 S3 client
+        bucket (str): S3 bucket name
+        prefix (str): Prefix holding trading_date=YYYY-MM-DD/ partitions
+
+    Returns:
+        dict: Sets of object names found under each date's partition
+    """
+    partitions = {}
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/trading_date="):
+        for item in page.get('Contents', []):
+            partition, _, filename = item['Key'][len(prefix) + 1:].partition('/')
+            trading_date = partition[len('trading_date='):]
+            partitions.setdefault(trading_date, set()).add(filename)
+
+    return partitions
+
+def list_manifest_dates(s3, bucket):
+    """
+    Lists the trading dates that have manifest files, from MANIFEST_DIR on
+    local disk when it is set, otherwise from the bucket.
+
+    Returns:
+        dict: Sets of manifest file names found under each date's partition
+    """
+    if not MANIFEST_DIR:
+        return list_partition_dates(s3, bucket, MANIFEST_PREFIX)
+
+    partitions = {}
+    root = os.path.join(MANIFEST_DIR, *MANIFEST_PREFIX.split('/'))
+    if os.path.isdir(root):
+        for partition in os.listdir(root):
+            if partition.startswith('trading_date='):
+                partitions[partition[len('trading_date='):]] = set(os.listdir(os.path.join(root, partition)))
+
+    return partitions
+
+def filter_collected_dates(dates, bucket, s3=None):
+    """
+    Removes dates that have already been fully collected.
+
+    A date is kept when it has no raw/magnificent7/ partition yet, or when its
+    collection manifest exists without a _SUCCESS marker (a run that stopped
+    partway or a day with failed tickers). Partitions written before
+    manifests existed count as complete.
+
+    Args:
+        dates (list): Candidate dates in YYYY-MM-DD format
+        bucket (str): S3 bucket holding the collected data
+        s3: Optional S3 client, e.g. local storage for offline backfills
+
+    Returns:
+        list: Dates that still need collecting, in the original order
+    """
+    if s3 is None:
+        import boto3
+        s3 = boto3.client('s3')
+
+    collected = list_partition_dates(s3, bucket, 'raw/magnificent7')
+    manifests = list_manifest_dates(s3, bucket)
+
+    pending = [
+        date for date in dates
+        if date not in collected
+        or (date in manifests and '_SUCCESS' not in manifests[date])
+    ]
+
+    print(json.dumps({
+        'metadata': {
+            'candidate_count': len(dates),
+            'already_collected': len(dates) - len(pending),
+            'pending_count': len(pending)
+        }
+    }))
+
+    return pending
@@ -0,0 +1,200 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+# Shared by the collector and both date generators. Lambda adds a layer's
+# python/ directory to sys.path, so this module is deployed inside the layer
+# zip next to the third-party dependencies.
+
+EXCHANGE_TIMEZONE = ZoneInfo("America/New_York")
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# Closures outside the regular holiday rules
+SPECIAL_CLOSURES = {
+    date(2001, 9, 11), date(2001, 9, 12), date(2001, 9, 13), date(2001, 9, 14),  # September 11
+    date(2004, 6, 11),   # President Reagan's funeral
+    date(2007, 1, 2),    # President Ford's funeral
+    date(2012, 10, 29), date(2012, 10, 30),  # Hurricane Sandy
+    date(2018, 12, 5),   # President George H.W. Bush's funeral
+    date(2025, 1, 9)     # President Carter's funeral
+}
+
+# Early closes that differ from the regular rules
+SPECIAL_EARLY_CLOSES = {date(2002, 7, 5), date(2003, 12, 26), date(2005, 6, 1)}
+SKIPPED_EARLY_CLOSES = {date(2002, 7, 3)}
+
+def easter_sunday(year):
+    """
+    Computes Western Easter Sunday using the anonymous Gregorian algorithm.
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def nth_weekday(year, month, weekday, n):
+    """
+    Returns the nth (1-based) weekday of a month, or the last one when n is -1.
+    """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def observed(holiday):
+    """
+    Moves a fixed-date holiday off the weekend: Saturday to Friday, Sunday to Monday.
+    """
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+def nyse_holidays(year):
+    """
+    Returns the full-day NYSE holidays for a year.
+
+    Args:
+        year (int): Calendar year
+
+    Returns:
+        set: Holiday dates
+    """
+    holidays = {
+        nth_weekday(year, 2, 0, 3),              # Washington's Birthday
+        easter_sunday(year) - timedelta(days=2), # Good Friday
+        nth_weekday(year, 5, 0, -1),             # Memorial Day
+        observed(date(year, 7, 4)),              # Independence Day
+        nth_weekday(year, 9, 0, 1),              # Labor Day
+        nth_weekday(year, 11, 3, 4),             # Thanksgiving
+        observed(date(year, 12, 25))             # Christmas
+    }
+
+    # New Year's Day is not observed on the prior Friday when it falls on a Saturday
+    new_years = date(year, 1, 1)
+    if new_years.weekday() != 5:
+        holidays.add(observed(new_years))
+
+    if year >= 1998:
+        holidays.add(nth_weekday(year, 1, 0, 3))  # Martin Luther King Jr. Day
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+
+    return holidays
+
+def nyse_early_closes(year, holidays):
+    """
+    Returns the 1:00 PM early-close sessions for a year.
+
+    Args:
+        year (int): Calendar year
+        holidays (set): Full-day holidays, so early closes never land on one
+
+    Returns:
+        set: Early-close dates
+    """
+    candidates = {
+        date(year, 7, 3),                                          # Day before Independence Day
+        nth_weekday(year, 11, 3, 4) + timedelta(days=1),           # Day after Thanksgiving
+        date(year, 12, 24)                                         # Christmas Eve
+    }
+    candidates = (candidates - SKIPPED_EARLY_CLOSES) | {day for day in SPECIAL_EARLY_CLOSES if day.year == year}
+    return {day for day in candidates if day.weekday() < 5 and day not in holidays}
+
+class ExchangeCalendar:
+    """
+    Precomputed NYSE session index for fast range and previous-session lookups.
+
+    Sessions are stored as a sorted list of ISO date strings, so lookups are
+    binary searches and slices rather than day-by-day loops.
+
+    Args:
+        start_year (int): First year to index
+        end_year (int): Last year to index
+    """
+    def __init__(self, start_year, end_year):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.holidays = set()
+        self.early_closes = set()
+
+        for year in range(start_year, end_year + 1):
+            holidays = nyse_holidays(year) | {day for day in SPECIAL_CLOSURES if day.year == year}
+            self.holidays |= holidays
+            self.early_closes |= nyse_early_closes(year, holidays)
+
+        sessions = []
+        current = date(start_year, 1, 1)
+        last = date(end_year, 12, 31)
+        while current <= last:
+            if current.weekday() < 5 and current not in self.holidays:
+                sessions.append(current.isoformat())
+            current += timedelta(days=1)
+
+        self.sessions = sessions
+        self.session_set = set(sessions)
+        self.early_close_set = {day.isoformat() for day in self.early_closes}
+
+    def is_session(self, trading_date):
+        """
+        Returns True if the exchange is open on a YYYY-MM-DD date.
+        """
+        return trading_date in self.session_set
+
+    def is_early_close(self, trading_date):
+        return trading_date in self.early_close_set
+
+    def session_close(self, trading_date):
+        """
+        Returns the closing time of a session as an aware datetime in New York time.
+        """
+        closing = EARLY_CLOSE if self.is_early_close(trading_date) else REGULAR_CLOSE
+        return datetime.combine(date.fromisoformat(trading_date), closing, EXCHANGE_TIMEZONE)
+
+    def sessions_in_range(self, start_date, end_date):
+        """
+        Returns the sessions between two YYYY-MM-DD dates, inclusive, oldest first.
+        """
+        return self.sessions[bisect_left(self.sessions, start_date):bisect_right(self.sessions, end_date)]
+
+    def previous_session(self, trading_date):
+        """
+        Returns the last session strictly before a YYYY-MM-DD date, or None.
+        """
+        index = bisect_left(self.sessions, trading_date)
+        return self.sessions[index - 1] if index > 0 else None
+
+    def next_session(self, trading_date):
+        """
+        Returns the first session strictly after a YYYY-MM-DD date, or None.
+        """
+        index = bisect_right(self.sessions, trading_date)
+        return self.sessions[index] if index < len(self.sessions) else None
+
+_calendars = {}
+
+def get_calendar(start_year=2000, end_year=None):
+    """
+    Returns a cached calendar covering start_year through end_year.
+
+    The default range runs from 2000 to next year, which covers every date
+    the collectors request. Calendars are cached at module level so warm
+    Lambda invocations reuse the precomputed index.
+    """
+    end_year = end_year or datetime.now(EXCHANGE_TIMEZONE).year + 1
+    key = (start_year, end_year)
+    if key not in _calendars:
+        _calendars[key] = ExchangeCalendar(start_year, end_year)
+    return _calendars[key]
@@ -0,0 +1,257 @@
+import json
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Manifests live next to, not inside, the raw/ partitions so Glue crawlers
+# over raw/magnificent7/ never pick them up. Set MANIFEST_DIR to keep them on
+# local disk instead of S3. Both settings come from the shared layer so the
+# date generators read the manifests from the same place.
+from collected_dates import MANIFEST_DIR, MANIFEST_PREFIX
+
+# Constituent results recorded between manifest saves while a date is being
+# collected, so a timeout partway through the S&P 500 loop keeps most of it
+MANIFEST_CHECKPOINT_TICKERS = int(os.environ.get('MANIFEST_CHECKPOINT_TICKERS', '50'))
+
+class CollectionManifest:
+    """
+    Per-date record of which tickers have been collected.
+
+    Each trading date gets its own manifest object, so parallel Map iterations
+    never write the same key. The manifest keeps each ticker's result, which
+    lets a rerun reuse completed tickers and only refetch the missing or
+    failed ones:
+
+    manifests/magnificent7/trading_date=YYYY-MM-DD/manifest.json
+    {
+        "trading_date": "2024-12-13",
+        "updated_at": "...",
+        "sp500": {
+            "AAPL": {"status": "complete", "market_cap": 3750689160990.0},
+            "GEV": {"status": "failed", "reason": "No market cap data"},
+            "SOLV": {"status": "failed", "reason": "HTTP 404 ...", "permanent": true}
+        },
+        "mag7": {
+            "AAPL": {"status": "complete", "details": {...}, "trading_data": {...}}
+        },
+        "summary": {...}
+    }
+
+    A `_SUCCESS` marker is written beside the manifest once the day's
+    market_data.json is stored with no failed tickers, so the date
+    generators can find incomplete dates, including days with failures, with
+    a single listing instead of reading every manifest. Permanent failures,
+    such as a 404 for a ticker not yet listed on the date, count as resolved:
+    they are neither refetched nor keep the day pending.
+
+    Args:
+        trading_date (str): Date in YYYY-MM-DD format
+        s3: boto3 S3 client, used unless MANIFEST_DIR is set
+        bucket (str): S3 bucket holding the manifests
+    """
+    def __init__(self, trading_date, s3=None, bucket=None):
+        self.trading_date = trading_date
+        self.s3 = s3
+        self.bucket = bucket
+        self.sp500 = {}
+        self.mag7 = {}
+        self.summary = None
+        self.complete = False
+
+    @property
+    def key(self):
+        return f"{MANIFEST_PREFIX}/trading_date={self.trading_date}/manifest.json"
+
+    @property
+    def success_key(self):
+        return f"{MANIFEST_PREFIX}/trading_date={self.trading_date}/_SUCCESS"
+
+    def _get(self, key):
+        if MANIFEST_DIR:
+            path = os.path.join(MANIFEST_DIR, key)
+            if not os.path.exists(path):
+                return None
+            with open(path, 'r') as manifest_file:
+                return manifest_file.read()
+
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def _put(self, key, body):
+        if MANIFEST_DIR:
+            path = os.path.join(MANIFEST_DIR, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as manifest_file:
+                manifest_file.write(body)
+        else:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def _delete(self, key):
+        if MANIFEST_DIR:
+            path = os.path.join(MANIFEST_DIR, key)
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def load(self):
+        """
+        Reads the stored manifest for the date, if any.
+
+        Returns:
+            CollectionManifest: self, for chaining
+        """
+        body = self._get(self.key)
+        if body:
+            document = json.loads(body)
+            self.sp500 = document.get('sp500', {})
+            self.mag7 = document.get('mag7', {})
+            self.summary = document.get('summary')
+        self.complete = self._get(self.success_key) is not None
+        return self
+
+    def save(self):
+        """
+        Writes the manifest; call after each stage as a checkpoint.
+        """
+        self._put(self.key, json.dumps({
+            'trading_date': self.trading_date,
+            'updated_at': datetime.now(ZoneInfo("America/New_York")).isoformat(),
+            'sp500': self.sp500,
+            'mag7': self.mag7,
+            'summary': self.summary
+        }))
+
+    def reset(self):
+        """
+        Removes the _SUCCESS marker so the date is recollected from scratch;
+        used when a collection is forced.
+        """
+        if self._get(self.success_key) is not None:
+            self._delete(self.success_key)
+        self.complete = False
+
+    def failed_tickers(self, sp500_tickers=None):
+        """
+        Returns the constituents and Magnificent 7 tickers that failed and
+        could succeed on a rerun.
+
+        Args:
+            sp500_tickers (list): The date's constituents; entries for other
+                tickers, left by an earlier constituent list, are ignored
+        """
+        members = set(sp500_tickers) if sp500_tickers is not None else set(self.sp500)
+        return sorted(
+            {
+                ticker for ticker, entry in self.sp500.items()
+                if ticker in members and entry.get('status') == 'failed' and not entry.get('permanent')
+            }
+            | {ticker for ticker, entry in self.mag7.items() if entry.get('status') == 'failed'}
+        )
+
+    def mark_complete(self, summary, sp500_tickers=None):
+        """
+        Records the day's summary and writes the _SUCCESS marker if no
+        ticker failed. A day with failures stays pending, so the next
+        backfill reruns it and only refetches the failed tickers.
+
+        Args:
+            summary (dict): summarize_market_data output for the day
+            sp500_tickers (list): The date's constituents, see failed_tickers
+
+        Returns:
+            bool: True if the marker was written
+        """
+        self.summary = summary
+        self.save()
+
+        failed = self.failed_tickers(sp500_tickers)
+        if failed:
+            # A marker left by an earlier run would hide the new failures
+            if self.complete:
+                self._delete(self.success_key)
+                self.complete = False
+            print(f"{len(failed)} tickers failed for {self.trading_date}, leaving it pending")
+            return False
+
+        self._put(self.success_key, '')
+        self.complete = True
+        return True
+
+    def pending_sp500(self, tickers):
+        """
+        Returns the constituents that still need a market cap for this date.
+        """
+        return [
+            ticker for ticker in tickers
+            if self.sp500.get(ticker, {}).get('status') != 'complete'
+            and not self.sp500.get(ticker, {}).get('permanent')
+        ]
+
+    def record_sp500(self, processed_tickers, failed_tickers):
+        for entry in processed_tickers:
+            self.sp500[entry['ticker']] = {'status': 'complete', 'market_cap': entry['market_cap']}
+        for entry in failed_tickers:
+            self.sp500[entry['ticker']] = {'status': 'failed', 'reason': entry['reason']}
+            if entry.get('permanent'):
+                self.sp500[entry['ticker']]['permanent'] = True
+
+    def sp500_recorder(self, every=MANIFEST_CHECKPOINT_TICKERS):
+        """
+        Returns an on_result callback for get_sp500_total_market_cap that
+        records each constituent and saves the manifest every `every` results.
+        """
+        recorded = 0
+
+        def record(processed, failed):
+            nonlocal recorded
+            self.record_sp500([processed] if processed else [], [failed] if failed else [])
+            recorded += 1
+            if every > 0 and recorded % every == 0:
+                self.save()
+
+        return record
+
+    def sp500_results(self, tickers):
+        """
+        Rebuilds processed and failed lists for tickers in their original order.
+
+        Returns:
+            tuple: (total_market_cap, processed_tickers, failed_tickers)
+        """
+        total_market_cap = 0
+        processed_tickers = []
+        failed_tickers = []
+
+        for ticker in tickers:
+            entry = self.sp500.get(ticker)
+            if entry and entry['status'] == 'complete':
+                total_market_cap += entry['market_cap']
+                processed_tickers.append({'ticker': ticker, 'market_cap': entry['market_cap']})
+            else:
+                failed = {
+                    'ticker': ticker,
+                    'reason': (entry or {}).get('reason', 'Not collected')
+                }
+                if (entry or {}).get('permanent'):
+                    failed['permanent'] = True
+                failed_tickers.append(failed)
+
+        return total_market_cap, processed_tickers, failed_tickers
+
+    def get_mag7(self, ticker):
+        """
+        Returns stored (details, trading_data) for a completed Mag 7 ticker.
+        """
+        entry = self.mag7.get(ticker)
+        if entry and entry.get('status') == 'complete':
+            return entry['details'], entry['trading_data']
+        return None
+
+    def record_mag7(self, ticker, details, trading_data):
+        if details and trading_data and details.get('market_cap'):
+            self.mag7[ticker] = {'status': 'complete', 'details': details, 'trading_data': trading_data}
+        else:
+            self.mag7[ticker] = {'status': 'failed'}
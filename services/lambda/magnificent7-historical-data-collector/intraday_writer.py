@@ -0,0 +1,150 @@
+import gzip
+import io
+import json
+import os
+import re
+
+# Intraday bars live beside the daily documents, partitioned the same way:
+# raw/magnificent7_intraday/timespan=minute/trading_date=YYYY-MM-DD/ticker=AAPL/part-00000.jsonl.gz
+INTRADAY_PREFIX = os.environ.get('INTRADAY_PREFIX', 'raw/magnificent7_intraday')
+
+# Bars per object. A regular day of minute bars including extended hours is
+# ~960 rows, so each ticker-day is normally a single object.
+INTRADAY_CHUNK_ROWS = int(os.environ.get('INTRADAY_CHUNK_ROWS', '10000'))
+
+PART_NUMBER = re.compile(r'/part-(\d+)\.jsonl\.gz$')
+
+def intraday_prefix(timespan, trading_date, ticker):
+    return f"{INTRADAY_PREFIX}/timespan={timespan}/trading_date={trading_date}/ticker={ticker}/"
+
+def intraday_key(timespan, trading_date, ticker, part):
+    return f"{intraday_prefix(timespan, trading_date, ticker)}part-{part:05d}.jsonl.gz"
+
+class IntradayChunkWriter:
+    """
+    Streams one ticker's bars into gzip-compressed JSON Lines objects.
+
+    Bars are compressed as they are written and uploaded whenever the
+    trading date changes or a chunk reaches `chunk_rows`, so memory holds at
+    most one compressed chunk regardless of how many days are collected.
+    Part numbers restart at 0 for each date, so reruns overwrite the same
+    keys, and once a date is written any higher-numbered parts left by an
+    earlier run that produced more of them are deleted.
+
+    Args:
+        s3: boto3 S3 client
+        bucket (str): Data bucket
+        ticker (str): Current ticker symbol, used in the key
+        timespan (str): Bar size label for the key, e.g. "minute" or "5minute"
+        chunk_rows (int): Maximum bars per object
+    """
+    def __init__(self, s3, bucket, ticker, timespan, chunk_rows=INTRADAY_CHUNK_ROWS):
+        self.s3 = s3
+        self.bucket = bucket
+        self.ticker = ticker
+        self.timespan = timespan
+        self.chunk_rows = chunk_rows
+        self.trading_date = None
+        self.part = 0
+        self.rows = 0
+        self.buffer = None
+        self.stream = None
+        self.dates = set()
+        self.objects = 0
+        self.total_rows = 0
+        self.bytes_written = 0
+
+    def write(self, trading_date, bar):
+        """
+        Adds a bar; bars must arrive in timestamp order.
+        """
+        if trading_date != self.trading_date:
+            self.flush()
+            self.remove_stale_parts()
+            self.trading_date = trading_date
+            self.part = 0
+            self.dates.add(trading_date)
+        elif self.rows >= self.chunk_rows:
+            self.flush()
+
+        if self.stream is None:
+            self.buffer = io.BytesIO()
+            self.stream = gzip.GzipFile(fileobj=self.buffer, mode='wb')
+
+        self.stream.write((json.dumps(bar) + '\n').encode())
+        self.rows += 1
+
+    def flush(self):
+        """
+        Uploads the current chunk, if it has any bars.
+        """
+        if not self.rows:
+            return
+
+        self.stream.close()
+        body = self.buffer.getvalue()
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=intraday_key(self.timespan, self.trading_date, self.ticker, self.part),
+            Body=body
+        )
+
+        self.objects += 1
+        self.total_rows += self.rows
+        self.bytes_written += len(body)
+        self.part += 1
+        self.rows = 0
+        self.buffer = None
+        self.stream = None
+
+    def remove_stale_parts(self):
+        """
+        Deletes parts of the current date numbered past those just written.
+        """
+        if self.trading_date is None:
+            return
+
+        paginator = self.s3.get_paginator('list_objects_v2')
+        prefix = intraday_prefix(self.timespan, self.trading_date, self.ticker)
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                match = PART_NUMBER.search(item['Key'])
+                if match and int(match.group(1)) >= self.part:
+                    self.s3.delete_object(Bucket=self.bucket, Key=item['Key'])
+
+    def summary(self):
+        return {
+            'dates': len(self.dates),
+            'objects': self.objects,
+            'bars': self.total_rows,
+            'bytes': self.bytes_written
+        }
+
+    def close(self):
+        """
+        Uploads the last chunk and returns what was written.
+
+        Returns:
+            dict: Dates, objects, bars and compressed bytes written
+        """
+        self.flush()
+        self.remove_stale_parts()
+        return self.summary()
+
+    def abort(self):
+        """
+        Discards the unflushed chunk after a failure.
+
+        Dates already finished keep their parts. The unfinished date keeps the
+        parts uploaded so far, and no parts are deleted, so a failed rerun
+        never replaces a complete earlier day with part of one.
+
+        Returns:
+            dict: Dates, objects, bars and compressed bytes written
+        """
+        if self.stream is not None:
+            self.stream.close()
+        self.rows = 0
+        self.buffer = None
+        self.stream = None
+        return self.summary()
@@ -1,75 +1,223 @@
 from polygon import RESTClient
 import json
 import os
-import boto3
-from datetime import datetime, timedelta
+from datetime import date, datetime, time as datetime_time
 from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import time
+from shares_cache import SharesOutstandingCache
+from collection_manifest import CollectionManifest
+from intraday_writer import IntradayChunkWriter
+from metrics import metrics
+from response_cache import ResponseCache
+from retry_policy import CircuitBreaker, PolygonHTTPError, call_with_retry, raise_for_status
+from exchange_calendar import get_calendar
+from universe_index import KNOWN_LISTINGS, KNOWN_RENAMES, UniverseIndex, get_universe_index
+
+# Polygon plan limits. Stocks Starter allows unlimited calls, but we keep a
+# ceiling so parallel Map iterations do not trip the API's abuse protection.
+# 0 or less disables the limit.
+POLYGON_REQUESTS_PER_SECOND = float(os.environ.get('POLYGON_REQUESTS_PER_SECOND', '5'))
+POLYGON_MAX_WORKERS = int(os.environ.get('POLYGON_MAX_WORKERS', '8'))
+
+# Override to point the client at another server, e.g. the benchmark's
+# simulated API
+POLYGON_BASE_URL = os.environ.get('POLYGON_BASE_URL', 'https://api.polygon.io')
+
+# "ticker" requests daily bars one ticker at a time; "grouped" pulls the whole
+# market's bars for the date in a single grouped-daily request.
+AGGS_MODE = os.environ.get('AGGS_MODE', 'ticker')
+
+# "details" reads market_cap from ticker details for every ticker each day;
+# "shares_cache" computes shares outstanding x unadjusted close, only calling
+# ticker details when the cached shares count is missing or stale.
+MARKET_CAP_SOURCE = os.environ.get('MARKET_CAP_SOURCE', 'details')
+SHARES_CACHE_PATH = os.environ.get('SHARES_CACHE_PATH')
+SHARES_CACHE_KEY = os.environ.get('SHARES_CACHE_KEY', 'reference/shares_outstanding.json')
+
+# The shares cache needs the grouped-daily bars for split and close detection,
+# so with it the Mag 7 bars come from that request in either AGGS_MODE
+USE_GROUPED_DAILY = AGGS_MODE == 'grouped' or MARKET_CAP_SOURCE == 'shares_cache'
+
+# Record per-ticker progress so reruns only fetch missing or failed work.
+# Off by default: it writes and deletes under manifests/ and needs
+# s3:DeleteObject and s3:ListBucket on the bucket
+USE_MANIFEST = os.environ.get('USE_MANIFEST', 'false').lower() == 'true'
+
+# Also write flat Parquet tables for each day alongside the JSON document
+WRITE_PARQUET = os.environ.get('WRITE_PARQUET', 'false').lower() == 'true'
+
+# Bars requested per page in intraday mode. Polygon caps this at 50,000,
+# about 50 trading days of minute bars including extended hours.
+INTRADAY_PAGE_LIMIT = int(os.environ.get('INTRADAY_PAGE_LIMIT', '50000'))
+
+# Minute aggregates behind one bar of each intraday timespan
+MINUTES_PER_TIMESPAN = {'minute': 1, 'hour': 60}
+
+# The Magnificent 7 companies
+MAGNIFICENT_7 = [
+    "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA"
+]
+
+# S&P 500 tickers for market cap comparison, used when no universe index is available
+SP500_TICKERS = ['AAPL', 'NVDA', 'MSFT', 'AMZN', 'META', 'TSLA', 'GOOGL', 'BRK.B', 'GOOG', 'AVGO', 'JPM', 'LLY', 'V', 'UNH', 'XOM', 'COST', 'MA', 'HD', 'WMT', 'PG', 'NFLX', 'JNJ', 'CRM', 'BAC', 'ABBV', 'ORCL', 'CVX', 'MRK', 'WFC', 'ADBE', 'KO', 'CSCO', 'NOW', 'ACN', 'AMD', 'IBM', 'PEP', 'LIN', 'MCD', 'DIS', 'PM', 'TMO', 'ABT', 'ISRG', 'CAT', 'GE', 'GS', 'INTU', 'VZ', 'BKNG', 'QCOM', 'TXN', 'T', 'AXP', 'CMCSA', 'SPGI', 'MS', 'RTX', 'LOW', 'NEE', 'PLTR', 'PGR', 'DHR', 'ETN', 'HON', 'AMGN', 'PFE', 'BLK', 'AMAT', 'TJX', 'UNP', 'UBER', 'C', 'BX', 'COP', 'BSX', 'SYK', 'PANW', 'ADP', 'SCHW', 'BMY', 'TMUS', 'FI', 'VRTX', 'GILD', 'DE', 'SBUX', 'BA', 'MU', 'ANET', 'MMC', 'LMT', 'ADI', 'MDT', 'KKR', 'CB', 'PLD', 'LRCX', 'MO', 'AMT', 'GEV', 'NKE', 'EQIX', 'TT', 'SO', 'UPS', 'PYPL', 'CMG', 'ICE', 'PH', 'APH', 'SHW', 'INTC', 'CI', 'ELV', 'KLAC', 'DUK', 'CME', 'CRWD', 'CDNS', 'MDLZ', 'PNC', 'REGN', 'AON', 'MSI', 'USB', 'WM', 'ZTS', 'CEG', 'SNPS', 'MCK', 'MCO', 'CL', 'CTAS', 'WELL', 'EMR', 'ITW', 'MMM', 'ORLY', 'EOG', 'TDG', 'COF', 'APD', 'GD', 'CVS', 'WMB', 'MAR', 'CSX', 'ADSK', 'NOC', 'AJG', 'HLT', 'OKE', 'BDX', 'ECL', 'TFC', 'FDX', 'FTNT', 'CARR', 'TGT', 'RCL', 'PCAR', 'FCX', 'ABNB', 'GM', 'TRV', 'BK', 'HCA', 'DLR', 'ROP', 'NSC', 'FICO', 'SLB', 'URI', 'SRE', 'AZO', 'SPG', 'JCI', 'NXPI', 'AMP', 'VST', 'CPRT', 'AFL', 'PSX', 'ALL', 'KMI', 'GWW', 'PSA', 'ROST', 'CMI', 'AEP', 'MPC', 'MET', 'AXON', 'PWR', 'O', 'AIG', 'MSCI', 'HWM', 'NEM', 'D', 'FIS', 'DHI', 'FAST', 'TEL', 'LULU', 'PAYX', 'KMB', 'PRU', 'DFS', 'PEG', 'LHX', 'PCG', 'AME', 'CCI', 'RSG', 'KVUE', 'EW', 'TRGP', 'COR', 'VLO', 'CBRE', 'DAL', 'IR', 'CTVA', 'F', 'BKR', 'A', 'VRSK', 'CTSH', 'EA', 'OTIS', 'IT', 'SYY', 'LEN', 'KR', 'HES', 'CHTR', 'XEL', 'YUM', 'ODFL', 'GLW', 'VMC', 'EXC', 'STZ', 'GEHC', 'MNST', 'KDP', 'ACGL', 'GIS', 'WAB', 'IDXX', 'MLM', 'DELL', 'RMD', 'HPQ', 'MTB', 'IRM', 'IQV', 'HIG', 'EXR', 'DD', 'HUM', 'NUE', 'GRMN', 'NDAQ', 'ROK', 'VICI', 'EFX', 'UAL', 'ED', 'WTW', 'EIX', 'ETR', 'AVB', 'OXY', 'FITB', 'MCHP', 'CSGP', 'FANG', 'DXCM', 'HPE', 'EBAY', 'TTWO', 'XYL', 'WEC', 'TSCO', 'DECK', 'RJF', 'ANSS', 'GPN', 'KEYS', 'CAH', 'CNC', 'DOW', 'STT', 'PPG', 'GDDY', 'MPWR', 'ON', 'NVR', 'DOV', 'FTV', 'TROW', 'BR', 'KHC', 'NTAP', 'SW', 'CCL', 'SYF', 'MTD', 'TYL', 'VLTO', 'PHM', 'CHD', 'BRO', 'HSY', 'AWK', 'EQT', 'HBAN', 'VTR', 'HAL', 'CPAY', 'TPL', 'EQR', 'DTE', 'HUBB', 'PPL', 'ADM', 'AEE', 'CINF', 'PTC', 'CDW', 'RF', 'WBD', 'EXPE', 'SBAC', 'WST', 'WDC', 'BIIB', 'WAT', 'WY', 'IFF', 'TDY', 'SMCI', 'ATO', 'ZBH', 'LDOS', 'DVN', 'NTRS', 'K', 'PKG', 'LYV', 'ES', 'CBOE', 'STE', 'ZBRA', 'CFG', 'FE', 'FSLR', 'STX', 'CLX', 'CNP', 'NRG', 'LUV', 'BLDR', 'ULTA', 'OMC', 'DRI', 'CMS', 'LYB', 'IP', 'COO', 'STLD', 'LH', 'MKC', 'TER', 'ESS', 'LVS', 'INVH', 'WRB', 'SNA', 'PODD', 'MAA', 'EL', 'CTRA', 'TRMB', 'FDS', 'PFG', 'DG', 'TSN', 'PNR', 'MAS', 'DGX', 'KEY', 'HOLX', 'IEX', 'BALL', 'BBY', 'MOH', 'J', 'GPC', 'KIM', 'GEN', 'EXPD', 'NI', 'ALGN', 'AVY', 'BAX', 'ARE', 'EG', 'DPZ', 'VRSN', 'CF', 'L', 'LNT', 'TXT', 'JBL', 'VTRS', 'APTV', 'DOC', 'MRNA', 'FFIV', 'AKAM', 'AMCR', 'JBHT', 'DLTR', 'EVRG', 'RVTY', 'TPR', 'POOL', 'SWKS', 'EPAM', 'ROL', 'NDSN', 'UDR', 'KMX', 'HST', 'CAG', 'SWK', 'CPT', 'JKHY', 'DAY', 'SJM', 'CHRW', 'ALB', 'ALLE', 'NCLH', 'INCY', 'REG', 'JNPR', 'BG', 'EMN', 'TECH', 'BXP', 'AIZ', 'UHS', 'PAYC', 'CTLT', 'LW', 'NWSA', 'IPG', 'GNRC', 'TAP', 'FOXA', 'PNW', 'ERIE', 'LKQ', 'CRL', 'ENPH', 'SOLV', 'HRL', 'GL', 'AES', 'HSIC', 'RL', 'MKTX', 'WYNN', 'AOS', 'TFX', 'HAS', 'FRT', 'MTCH', 'MGM', 'CPB', 'MOS', 'BF.B', 'CZR', 'IVZ', 'APA', 'CE', 'BWA', 'DVA', 'HII', 'FMC', 'MHK', 'BEN', 'PARA', 'QRVO', 'WBA', 'FOX', 'NWS', 'AMTM']
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter shared by every Polygon request.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Each
+    request takes one token, blocking until one is available, so the combined
+    request rate of all worker threads never exceeds the plan limit.
+
+    Args:
+        rate (float): Tokens added per second (requests per second); 0 or
+            less disables rate limiting
+        capacity (float): Maximum burst size, defaults to one second of tokens
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes one token, sleeping until one is available.
+
+        Returns:
+            float: Seconds spent waiting for the token
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+# Shared across the S&P loop, company details and aggregates requests
+rate_limiter = TokenBucket(POLYGON_REQUESTS_PER_SECOND)
+
+def throttle():
+    """
+    Waits for a rate-limit token and records the time spent waiting.
+    """
+    metrics.observe('rate_limit_wait', rate_limiter.acquire())
+
+# Shared by all worker threads so a throttling or failing API pauses them all
+circuit_breaker = CircuitBreaker()
+
+def call_polygon(function, *args, **kwargs):
+    """
+    Calls a Polygon client method under the rate limiter, retrying 429s,
+    5xx responses and connection errors.
+
+    Args:
+        function: Client method, e.g. client.get_ticker_details
+        *args, **kwargs: Arguments for the method
+
+    Returns:
+        The method's return value; raises once retries are exhausted or on
+        a permanent error such as 404
+    """
+    return call_with_retry(lambda: function(*args, **kwargs), circuit_breaker, before_attempt=throttle)
+
+# Kept across warm invocations of the same container
+response_cache = ResponseCache()
+
+def fetch_ticker_details(client, historical_ticker, trading_date):
+    """
+    Returns ticker details for a symbol and date, from the response cache when
+    the same request was already made.
+    """
+    return response_cache.get_or_fetch(
+        ('ticker_details', historical_ticker, trading_date),
+        lambda: call_polygon(client.get_ticker_details, historical_ticker, date=trading_date)
+    )
 
 def get_previous_trading_date():
     """
-    Determines the most recent trading day, accounting for weekends.
+    Determines the most recent trading day, accounting for weekends and
+    exchange holidays via the shared exchange calendar.
     This function ensures we don't request data for non-trading days.
     
     Returns:
         str: Date in YYYY-MM-DD format representing the last trading day
     """
     et_now = datetime.now(ZoneInfo("America/New_York"))
-    date = et_now - timedelta(days=1)
-    
-    # Handle weekend cases by moving back to Friday
-    if date.weekday() == 6:  # Sunday
-        date = date - timedelta(days=2)
-    elif date.weekday() == 5:  # Saturday
-        date = date - timedelta(days=1)
-    
-    return date.date().isoformat()
+    return get_calendar().previous_session(et_now.date().isoformat())
 
-def get_historical_ticker(ticker, trading_date):
+def get_trading_dates(event):
     """
-    Returns the historically accurate ticker symbol for a given date.
-    
-    Some companies have changed their ticker symbols over time. This function
-    ensures we query using the correct historical symbol while maintaining
-    consistent modern naming in our stored data.
-    
-    Args:
-        ticker (str): Current ticker symbol
-        trading_date (str): Date in YYYY-MM-DD format
-        
+    Resolves the trading dates to collect from the invocation event.
+
+    Accepts:
+        - "YYYY-MM-DD": a single date (the Step Functions Map item)
+        - ["YYYY-MM-DD", ...] or {"dates": [...]}: an explicit list of dates
+        - {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD"}: every
+          trading session in the inclusive range
+        - anything else: the previous trading date
+
     Returns:
-        str: The historically accurate ticker symbol for that date
+        list: Sorted, de-duplicated dates in YYYY-MM-DD format
     """
-    # Meta changed from FB to META on June 9, 2022 but API only shows proper data from June 10, 2022
-    meta_change_date = "2022-06-09"
-    
-    if ticker == "META" and trading_date <= meta_change_date:
-        return "FB"
-    
-    return ticker
+    if isinstance(event, str):
+        return [event]
 
-def get_historical_ticker_aggs(ticker, trading_date):
+    if isinstance(event, dict) and event.get('dates'):
+        event = event['dates']
+
+    if isinstance(event, list) and event:
+        return sorted(set(event))
+
+    if isinstance(event, dict) and event.get('start_date') and event.get('end_date'):
+        return get_calendar().sessions_in_range(event['start_date'], event['end_date'])
+
+    return [get_previous_trading_date()]
+
+# Symbol changes used when no universe index has been loaded
+default_universe_index = UniverseIndex({}, listings=KNOWN_LISTINGS, renames=KNOWN_RENAMES)
+
+def get_historical_ticker(ticker, trading_date, endpoint='details'):
     """
     Returns the historically accurate ticker symbol for a given date.
     
     Some companies have changed their ticker symbols over time. This function
     ensures we query using the correct historical symbol while maintaining
-    consistent modern naming in our stored data.
+    consistent modern naming in our stored data. Symbol changes come from the
+    universe index, e.g. META traded as FB until June 2022.
     
     Args:
         ticker (str): Current ticker symbol
         trading_date (str): Date in YYYY-MM-DD format
+        endpoint (str): "details" or "aggs"; ticker details only return data
+            under a new symbol a day later than aggregates for some changes
         
     Returns:
         str: The historically accurate ticker symbol for that date
     """
-    # Meta changed from FB to META on June 9, 2022
-    meta_change_date = "2022-06-08"
-    
-    if ticker == "META" and trading_date <= meta_change_date:
-        return "FB"
-    
-    return ticker
+    universe = get_universe_index() or default_universe_index
+    return universe.historical_symbol(ticker, trading_date, endpoint)
+
+def get_historical_ticker_aggs(ticker, trading_date):
+    """
+    Returns the historically accurate ticker symbol for aggregates requests.
+    """
+    return get_historical_ticker(ticker, trading_date, endpoint='aggs')
 
 def get_stock_aggs(client, ticker, trading_date):
     """
@@ -93,19 +241,21 @@ def get_stock_aggs(client, ticker, trading_date):
     }
     """
     try:
-        time.sleep(0.5)  # Rate limit compliance
-
         # Get the historically accurate ticker for API queries
         historical_ticker = get_historical_ticker_aggs(ticker, trading_date)
         
         # Make the API call with proper parameters
-        response = client.get_aggs(
-            ticker=historical_ticker,
-            multiplier=1,
-            timespan="day",
-            from_=trading_date,
-            to=trading_date,
-            adjusted=True
+        response = response_cache.get_or_fetch(
+            ('aggs', historical_ticker, trading_date),
+            lambda: call_polygon(
+                client.get_aggs,
+                ticker=historical_ticker,
+                multiplier=1,
+                timespan="day",
+                from_=trading_date,
+                to=trading_date,
+                adjusted=True
+            )
         )
         
         # Check if we have valid results
@@ -114,19 +264,7 @@ def get_stock_aggs(client, ticker, trading_date):
             return None
             
         # Get the first (and should be only) result for our single day
-        agg = response[0]
-        
-        # Create our return dictionary using the correct property names
-        return {
-            'date': trading_date,
-            'close_price': float(agg.close),  # Using full property names
-            'open_price': float(agg.open),
-            'high_price': float(agg.high),
-            'low_price': float(agg.low),
-            'volume': int(agg.volume),
-            'vwap': float(agg.vwap) if hasattr(agg, 'vwap') else None,
-            'timestamp': agg.timestamp
-        }
+        return format_agg(response[0], trading_date)
         
     except Exception as e:
         print(f"Error fetching stock aggregates for {ticker} on {trading_date}: {str(e)}")
@@ -135,30 +273,366 @@ def get_stock_aggs(client, ticker, trading_date):
             print(f"Response structure: {str(response)}")
         return None
 
-def get_company_details(client, ticker, trading_date):
+def symbol_segments(ticker, trading_dates):
+    """
+    Groups consecutive dates by the symbol used to query them.
+
+    Args:
+        ticker (str): Current ticker symbol
+        trading_dates (list): Sorted dates in YYYY-MM-DD format
+
+    Returns:
+        list: [historical_ticker, first_date, last_date] per segment
+    """
+    segments = []
+    for trading_date in trading_dates:
+        historical_ticker = get_historical_ticker_aggs(ticker, trading_date)
+        if segments and segments[-1][0] == historical_ticker:
+            segments[-1][2] = trading_date
+        else:
+            segments.append([historical_ticker, trading_date, trading_date])
+    return segments
+
+def get_stock_aggs_range(client, ticker, trading_dates):
+    """
+    Retrieves daily aggregates for a stock across a batch of dates with one
+    request per historical symbol, then splits the bars by trading date.
+
+    A range spanning a ticker change (e.g. FB to META) is split into one
+    request per symbol so each day uses its historically accurate ticker.
+
+    Args:
+        client: Polygon.io REST client
+        ticker (str): Current ticker symbol
+        trading_dates (list): Sorted dates in YYYY-MM-DD format
+
+    Returns:
+        dict: Trading data keyed by date in YYYY-MM-DD format
+    """
+    wanted = set(trading_dates)
+    bars = {}
+
+    for historical_ticker, from_date, to_date in symbol_segments(ticker, trading_dates):
+        try:
+            response = call_polygon(
+                client.get_aggs,
+                ticker=historical_ticker,
+                multiplier=1,
+                timespan="day",
+                from_=from_date,
+                to=to_date,
+                adjusted=True,
+                limit=50000
+            )
+
+            for agg in response or []:
+                # Daily bar timestamps mark the start of the session in Eastern time
+                bar_date = datetime.fromtimestamp(
+                    agg.timestamp / 1000, ZoneInfo("America/New_York")
+                ).date().isoformat()
+                if bar_date in wanted:
+                    bars[bar_date] = format_agg(agg, bar_date)
+
+        except Exception as e:
+            print(f"Error fetching stock aggregates for {ticker} from {from_date} to {to_date}: {str(e)}")
+
+    print(f"Loaded {len(bars)} daily bars for {ticker} from {trading_dates[0]} to {trading_dates[-1]}")
+    return bars
+
+def format_agg(agg, trading_date):
+    """
+    Converts a Polygon aggregate bar into our stored trading data structure.
+
+    Args:
+        agg: Polygon Agg or GroupedDailyAgg object
+        trading_date (str): Date in YYYY-MM-DD format
+
+    Returns:
+        dict: Trading data for the day
+    """
+    # Create our return dictionary using the correct property names
+    return {
+        'date': trading_date,
+        'close_price': float(agg.close),  # Using full property names
+        'open_price': float(agg.open),
+        'high_price': float(agg.high),
+        'low_price': float(agg.low),
+        'volume': int(agg.volume),
+        'vwap': float(agg.vwap) if getattr(agg, 'vwap', None) is not None else None,
+        'timestamp': agg.timestamp
+    }
+
+def stream_intraday_aggs(client, ticker, trading_dates, timespan='minute', multiplier=1):
+    """
+    Yields a ticker's intraday bars for the given dates, one page at a time.
+
+    Each page is a get_aggs request of up to INTRADAY_PAGE_LIMIT bars sorted
+    by time; the next page starts just after the last bar, so only one page
+    is held in memory however long the range is. A short page ends the
+    segment without another request. Ranges spanning a ticker
+    change use the historically accurate symbol for each segment.
+
+    Args:
+        client: Polygon.io REST client
+        ticker (str): Current ticker symbol
+        trading_dates (list): Sorted dates in YYYY-MM-DD format
+        timespan (str): "minute" or "hour"
+        multiplier (int): Bar size in timespans, e.g. 5 for 5-minute bars
+
+    Yields:
+        tuple: (trading_date, bar dict) in timestamp order
+    """
+    eastern = ZoneInfo("America/New_York")
+    calendar = get_calendar()
+    wanted = set(trading_dates)
+    regular_hours = {}
+
+    # The limit counts the minute aggregates a page is built from, so a full
+    # page of 5-minute bars holds at least a fifth of it and a full page of
+    # hour bars a sixtieth. Anything shorter is the last page.
+    full_page = max(1, INTRADAY_PAGE_LIMIT // (MINUTES_PER_TIMESPAN[timespan] * multiplier))
+
+    for historical_ticker, from_date, to_date in symbol_segments(ticker, trading_dates):
+        cursor = int(datetime.combine(date.fromisoformat(from_date), datetime_time.min, eastern).timestamp() * 1000)
+        end = int(datetime.combine(date.fromisoformat(to_date), datetime_time.max, eastern).timestamp() * 1000)
+
+        while cursor <= end:
+            page = call_polygon(
+                client.get_aggs,
+                ticker=historical_ticker,
+                multiplier=multiplier,
+                timespan=timespan,
+                from_=cursor,
+                to=end,
+                adjusted=True,
+                sort='asc',
+                limit=INTRADAY_PAGE_LIMIT
+            )
+            if not page:
+                break
+
+            for agg in page:
+                bar_time = datetime.fromtimestamp(agg.timestamp / 1000, eastern)
+                bar_date = bar_time.date().isoformat()
+                if bar_date not in wanted:
+                    continue
+
+                if bar_date not in regular_hours:
+                    regular_hours[bar_date] = (datetime_time(9, 30), calendar.session_close(bar_date).time())
+                market_open, market_close = regular_hours[bar_date]
+
+                yield bar_date, {
+                    'ticker': ticker,
+                    'timestamp': agg.timestamp,
+                    'time': bar_time.strftime('%H:%M'),
+                    'open': agg.open,
+                    'high': agg.high,
+                    'low': agg.low,
+                    'close': agg.close,
+                    'volume': agg.volume,
+                    'vwap': agg.vwap,
+                    'transactions': agg.transactions,
+                    'regular_session': market_open <= bar_time.time() < market_close
+                }
+
+            if len(page) < full_page:
+                break
+            cursor = page[-1].timestamp + 1
+
+def collect_intraday(client, s3, trading_dates, tickers, timespan='minute', multiplier=1):
+    """
+    Streams intraday bars for each ticker into chunked, compressed objects.
+
+    Tickers are collected one after another so memory holds a single page of
+    bars and a single compressed chunk, which keeps a year of minute bars
+    within Lambda memory limits.
+
+    Args:
+        client: Polygon.io REST client
+        s3: boto3 S3 client
+        trading_dates (list): Dates in YYYY-MM-DD format
+        tickers (list): Current ticker symbols
+        timespan (str): "minute" or "hour"
+        multiplier (int): Bar size in timespans
+
+    Returns:
+        dict: Per-ticker counts of dates, objects, bars and bytes written, or
+            the error for tickers that failed
+    """
+    trading_dates = sorted(trading_dates)
+    label = timespan if multiplier == 1 else f"{multiplier}{timespan}"
+    results = {}
+
+    for ticker in tickers:
+        print(f"Streaming {label} bars for {ticker} from {trading_dates[0]} to {trading_dates[-1]}...")
+        writer = IntradayChunkWriter(s3, os.environ['DATA_BUCKET'], ticker, label)
+        try:
+            for trading_date, bar in stream_intraday_aggs(client, ticker, trading_dates, timespan, multiplier):
+                writer.write(trading_date, bar)
+            results[ticker] = writer.close()
+            print(f"Stored {results[ticker]['bars']} bars for {ticker} in {results[ticker]['objects']} objects")
+        except Exception as e:
+            # Keep the dates already streamed; a rerun overwrites them
+            writer.abort()
+            print(f"Error streaming {label} bars for {ticker}: {str(e)}")
+            results[ticker] = {'error': str(e)}
+
+    return results
+
+def get_grouped_daily_aggs(client, trading_date, adjusted=True):
+    """
+    Retrieves daily bars for every U.S. stock in a single grouped-daily request.
+
+    Args:
+        client: Polygon.io REST client
+        trading_date (str): Date in YYYY-MM-DD format
+        adjusted (bool): Whether prices are adjusted for splits
+
+    Returns:
+        dict: Trading data keyed by the ticker symbol used on that date,
+            empty if the market was closed or the request failed
+    """
+    try:
+        response = call_polygon(client.get_grouped_daily_aggs, trading_date, adjusted=adjusted)
+
+        index = {}
+        for agg in response or []:
+            if getattr(agg, 'ticker', None) and agg.close is not None:
+                index[agg.ticker] = format_agg(agg, trading_date)
+
+        print(f"Loaded grouped daily bars for {len(index)} tickers on {trading_date}")
+        return index
+
+    except Exception as e:
+        print(f"Error fetching grouped daily aggregates for {trading_date}: {str(e)}")
+        return {}
+
+def lookup_stock_aggs(aggs_index, ticker, trading_date):
+    """
+    Looks up a ticker's daily bar in a grouped-daily index.
+
+    Uses the same historical symbol mapping as get_stock_aggs so stored data
+    keeps modern naming.
+
+    Args:
+        aggs_index (dict): Output of get_grouped_daily_aggs
+        ticker (str): Current ticker symbol
+        trading_date (str): Date in YYYY-MM-DD format
+
+    Returns:
+        dict: Trading data for the day, or None if the ticker did not trade
+    """
+    historical_ticker = get_historical_ticker_aggs(ticker, trading_date)
+    stock_data = aggs_index.get(historical_ticker)
+
+    if stock_data is None:
+        print(f"No aggregate data available for stock {ticker} on {trading_date}")
+
+    return stock_data
+
+def build_price_index(adjusted_index, unadjusted_index):
+    """
+    Combines adjusted and unadjusted grouped daily bars into the close prices
+    used to derive market cap.
+
+    Market cap must use the unadjusted close so it matches the share count as
+    of that date. The ratio of unadjusted to adjusted close is kept as a split
+    factor so the shares cache can detect splits between dates.
+
+    Args:
+        adjusted_index (dict): get_grouped_daily_aggs output with adjusted=True
+        unadjusted_index (dict): get_grouped_daily_aggs output with adjusted=False
+
+    Returns:
+        dict: {'close': float, 'split_factor': float} keyed by ticker symbol
+    """
+    price_index = {}
+    for symbol, unadjusted in unadjusted_index.items():
+        adjusted = adjusted_index.get(symbol)
+        price_index[symbol] = {
+            'close': unadjusted['close_price'],
+            'split_factor': unadjusted['close_price'] / adjusted['close_price']
+                if adjusted and adjusted['close_price'] else None
+        }
+    return price_index
+
+def get_cached_market_cap(shares_cache, price_index, ticker, trading_date):
+    """
+    Computes market cap from cached shares outstanding and the day's close.
+
+    Args:
+        shares_cache (SharesOutstandingCache): Loaded cache, or None
+        price_index (dict): build_price_index output, or None
+        ticker (str): Current ticker symbol
+        trading_date (str): Date in YYYY-MM-DD format
+
+    Returns:
+        tuple: (cache entry, market cap), or None if the cache cannot answer
+    """
+    if shares_cache is None or price_index is None:
+        return None
+
+    price = price_index.get(get_historical_ticker_aggs(ticker, trading_date))
+    if not price:
+        return None
+
+    entry = shares_cache.lookup(ticker, trading_date, price['split_factor'])
+    if not entry or not entry.get('shares'):
+        return None
+
+    return entry, entry['shares'] * price['close']
+
+def record_shares_outstanding(shares_cache, price_index, ticker, trading_date, response):
+    """
+    Stores shares outstanding and profile from a ticker details response.
+    """
+    shares = getattr(response, 'weighted_shares_outstanding', None)
+    if shares_cache is None or not shares:
+        return
+
+    price = (price_index or {}).get(get_historical_ticker_aggs(ticker, trading_date)) or {}
+    shares_cache.record(ticker, trading_date, shares, profile={
+        'name': getattr(response, 'name', None),
+        'currency': getattr(response, 'currency_name', None),
+        'description': getattr(response, 'description', None)
+    }, split_factor=price.get('split_factor'))
+
+def get_company_details(client, ticker, trading_date, price_index=None, shares_cache=None):
     """
     Retrieves company details using the Ticker Details v3 endpoint.
 
+    When a shares cache and price index are given, a fresh cache entry answers
+    without an API call.
+
     Args:
         client: Polygon.io REST client
         ticker (str): Stock ticker symbol
         trading_date (str): Date in YYYY-MM-DD format to fetch historical data for
+        price_index (dict): Optional build_price_index output
+        shares_cache (SharesOutstandingCache): Optional shares outstanding cache
     
     Returns:
         dict: Company details including historical market cap data
     """
-    try:
-        time.sleep(1)  # Rate limiting
+    cached = get_cached_market_cap(shares_cache, price_index, ticker, trading_date)
+    if cached and cached[0].get('name'):
+        entry, market_cap = cached
+        return {
+            'name': entry.get('name'),
+            'market_cap': market_cap,
+            'shares_outstanding': entry['shares'],
+            'currency': entry.get('currency'),
+            'description': entry.get('description')
+        }
 
+    try:
         # Get the historically accurate ticker for API queries
         historical_ticker = get_historical_ticker(ticker, trading_date)
 
-        response = client.get_ticker_details(
-            historical_ticker, 
-            date=trading_date
-        )
+        response = fetch_ticker_details(client, historical_ticker, trading_date)
         
         if response:
+            record_shares_outstanding(shares_cache, price_index, ticker, trading_date, response)
             return {
                 'name': getattr(response, 'name', None),
                 'market_cap': getattr(response, 'market_cap', None),
@@ -174,48 +648,115 @@ def get_company_details(client, ticker, trading_date):
         print(f"Error fetching company details for {ticker}: {str(e)}")
         return None
 
-def get_sp500_total_market_cap(client, sp500_tickers, trading_date):
+def get_ticker_market_cap(client, ticker, trading_date, price_index=None, shares_cache=None):
+    """
+    Fetches the market cap for a single S&P 500 constituent.
+
+    Args:
+        client: Polygon.io REST client
+        ticker (str): Stock ticker symbol
+        trading_date (str): Date in YYYY-MM-DD format
+        price_index (dict): Optional build_price_index output
+        shares_cache (SharesOutstandingCache): Optional shares outstanding cache
+
+    Returns:
+        tuple: (processed entry, failed entry), exactly one of which is None
+    """
+    cached = get_cached_market_cap(shares_cache, price_index, ticker, trading_date)
+    if cached:
+        return {
+            'ticker': ticker,
+            'market_cap': cached[1]
+        }, None
+
+    try:
+        # Get the historically accurate ticker for API queries
+        historical_ticker = get_historical_ticker(ticker, trading_date)
+
+        response = fetch_ticker_details(client, historical_ticker, trading_date)
+        
+        if response:
+            record_shares_outstanding(shares_cache, price_index, ticker, trading_date, response)
+
+        if response and hasattr(response, 'market_cap') and response.market_cap:
+            print(f"Successfully processed {ticker}: ${response.market_cap / 1e9:.2f}B")
+            return {
+                'ticker': ticker,
+                'market_cap': response.market_cap
+            }, None
+
+        print(f"No market cap data available for {ticker}")
+        return None, {
+            'ticker': ticker,
+            'reason': 'No market cap data'
+        }
+            
+    except Exception as e:
+        print(f"Error processing {ticker}: {str(e)}")
+        failed = {
+            'ticker': ticker,
+            'reason': str(e)
+        }
+        # Kept so the manifest can stop retrying tickers that cannot succeed
+        if isinstance(e, PolygonHTTPError) and e.permanent:
+            failed['permanent'] = True
+        return None, failed
+
+def get_sp500_total_market_cap(client, sp500_tickers, trading_date, max_workers=None,
+                               price_index=None, shares_cache=None, on_result=None):
     """
     Calculates the total market cap of the S&P 500 by fetching data for all constituents.
+
+    Requests are spread over a thread pool and paced by the shared rate limiter,
+    so throughput is bounded by the plan limit rather than a fixed pause. Results
+    keep the order of `sp500_tickers` regardless of completion order.
+
+    Args:
+        client: Polygon.io REST client
+        sp500_tickers (list): Constituent ticker symbols
+        trading_date (str): Date in YYYY-MM-DD format
+        max_workers (int): Thread pool size, defaults to POLYGON_MAX_WORKERS.
+            A value of 1 fetches sequentially.
+        price_index (dict): Optional build_price_index output
+        shares_cache (SharesOutstandingCache): Optional shares outstanding cache
+        on_result: Optional function called with (processed, failed) as each
+            ticker finishes, from the calling thread, e.g. to checkpoint progress
+
+    Returns:
+        tuple: (total_market_cap, processed_tickers, failed_tickers)
     """
     total_market_cap = 0
     processed_tickers = []
     failed_tickers = []
+    max_workers = max_workers or POLYGON_MAX_WORKERS
     
-    print(f"Starting to process {len(sp500_tickers)} S&P 500 constituents...")
-    
-    for ticker in sp500_tickers:
-        try:
-            time.sleep(1)
+    print(f"Starting to process {len(sp500_tickers)} S&P 500 constituents with {max_workers} workers...")
 
-            # Get the historically accurate ticker for API queries
-            historical_ticker = get_historical_ticker(ticker, trading_date)
+    results = [None] * len(sp500_tickers)
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(get_ticker_market_cap, client, ticker, trading_date, price_index, shares_cache): index
+                for index, ticker in enumerate(sp500_tickers)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if on_result:
+                    on_result(*results[futures[future]])
+    else:
+        for index, ticker in enumerate(sp500_tickers):
+            results[index] = get_ticker_market_cap(client, ticker, trading_date, price_index, shares_cache)
+            if on_result:
+                on_result(*results[index])
 
-            response = client.get_ticker_details(historical_ticker, date=trading_date)
-            
-            if response and hasattr(response, 'market_cap') and response.market_cap:
-                total_market_cap += response.market_cap
-                processed_tickers.append({
-                    'ticker': ticker,
-                    'market_cap': response.market_cap
-                })
-                print(f"Successfully processed {ticker}: ${response.market_cap / 1e9:.2f}B")
-            else:
-                print(f"No market cap data available for {ticker}")
-                failed_tickers.append({
-                    'ticker': ticker,
-                    'reason': 'No market cap data'
-                })
-                
-        except Exception as e:
-            print(f"Error processing {ticker}: {str(e)}")
-            failed_tickers.append({
-                'ticker': ticker,
-                'reason': str(e)
-            })
-            continue
+    for processed, failed in results:
+        if processed:
+            total_market_cap += processed['market_cap']
+            processed_tickers.append(processed)
+        else:
+            failed_tickers.append(failed)
     
-    success_rate = (len(processed_tickers) / len(sp500_tickers)) * 100
+    success_rate = (len(processed_tickers) / len(sp500_tickers)) * 100 if sp500_tickers else 0
     print(f"\nProcessing complete:")
     print(f"Successfully processed: {len(processed_tickers)} tickers ({success_rate:.1f}%)")
     print(f"Failed to process: {len(failed_tickers)} tickers")
@@ -223,126 +764,517 @@ def get_sp500_total_market_cap(client, sp500_tickers, trading_date):
     
     return total_market_cap, processed_tickers, failed_tickers
 
-def lambda_handler(event, context):
-    # Initialize API and AWS clients
-    client = RESTClient(os.environ['POLYGON_API_KEY'])
-    s3 = boto3.client('s3')
-    
-    # Define the Magnificent 7 companies
-    magnificent_7 = [
-        "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA"
-    ]
-    
-    # S&P 500 tickers for market cap comparison
-    sp500_tickers = ['AAPL', 'NVDA', 'MSFT', 'AMZN', 'META', 'TSLA', 'GOOGL', 'BRK.B', 'GOOG', 'AVGO', 'JPM', 'LLY', 'V', 'UNH', 'XOM', 'COST', 'MA', 'HD', 'WMT', 'PG', 'NFLX', 'JNJ', 'CRM', 'BAC', 'ABBV', 'ORCL', 'CVX', 'MRK', 'WFC', 'ADBE', 'KO', 'CSCO', 'NOW', 'ACN', 'AMD', 'IBM', 'PEP', 'LIN', 'MCD', 'DIS', 'PM', 'TMO', 'ABT', 'ISRG', 'CAT', 'GE', 'GS', 'INTU', 'VZ', 'BKNG', 'QCOM', 'TXN', 'T', 'AXP', 'CMCSA', 'SPGI', 'MS', 'RTX', 'LOW', 'NEE', 'PLTR', 'PGR', 'DHR', 'ETN', 'HON', 'AMGN', 'PFE', 'BLK', 'AMAT', 'TJX', 'UNP', 'UBER', 'C', 'BX', 'COP', 'BSX', 'SYK', 'PANW', 'ADP', 'SCHW', 'BMY', 'TMUS', 'FI', 'VRTX', 'GILD', 'DE', 'SBUX', 'BA', 'MU', 'ANET', 'MMC', 'LMT', 'ADI', 'MDT', 'KKR', 'CB', 'PLD', 'LRCX', 'MO', 'AMT', 'GEV', 'NKE', 'EQIX', 'TT', 'SO', 'UPS', 'PYPL', 'CMG', 'ICE', 'PH', 'APH', 'SHW', 'INTC', 'CI', 'ELV', 'KLAC', 'DUK', 'CME', 'CRWD', 'CDNS', 'MDLZ', 'PNC', 'REGN', 'AON', 'MSI', 'USB', 'WM', 'ZTS', 'CEG', 'SNPS', 'MCK', 'MCO', 'CL', 'CTAS', 'WELL', 'EMR', 'ITW', 'MMM', 'ORLY', 'EOG', 'TDG', 'COF', 'APD', 'GD', 'CVS', 'WMB', 'MAR', 'CSX', 'ADSK', 'NOC', 'AJG', 'HLT', 'OKE', 'BDX', 'ECL', 'TFC', 'FDX', 'FTNT', 'CARR', 'TGT', 'RCL', 'PCAR', 'FCX', 'ABNB', 'GM', 'TRV', 'BK', 'HCA', 'DLR', 'ROP', 'NSC', 'FICO', 'SLB', 'URI', 'SRE', 'AZO', 'SPG', 'JCI', 'NXPI', 'AMP', 'VST', 'CPRT', 'AFL', 'PSX', 'ALL', 'KMI', 'GWW', 'PSA', 'ROST', 'CMI', 'AEP', 'MPC', 'MET', 'AXON', 'PWR', 'O', 'AIG', 'MSCI', 'HWM', 'NEM', 'D', 'FIS', 'DHI', 'FAST', 'TEL', 'LULU', 'PAYX', 'KMB', 'PRU', 'DFS', 'PEG', 'LHX', 'PCG', 'AME', 'CCI', 'RSG', 'KVUE', 'EW', 'TRGP', 'COR', 'VLO', 'CBRE', 'DAL', 'IR', 'CTVA', 'F', 'BKR', 'A', 'VRSK', 'CTSH', 'EA', 'OTIS', 'IT', 'SYY', 'LEN', 'KR', 'HES', 'CHTR', 'XEL', 'YUM', 'ODFL', 'GLW', 'VMC', 'EXC', 'STZ', 'GEHC', 'MNST', 'KDP', 'ACGL', 'GIS', 'WAB', 'IDXX', 'MLM', 'DELL', 'RMD', 'HPQ', 'MTB', 'IRM', 'IQV', 'HIG', 'EXR', 'DD', 'HUM', 'NUE', 'GRMN', 'NDAQ', 'ROK', 'VICI', 'EFX', 'UAL', 'ED', 'WTW', 'EIX', 'ETR', 'AVB', 'OXY', 'FITB', 'MCHP', 'CSGP', 'FANG', 'DXCM', 'HPE', 'EBAY', 'TTWO', 'XYL', 'WEC', 'TSCO', 'DECK', 'RJF', 'ANSS', 'GPN', 'KEYS', 'CAH', 'CNC', 'DOW', 'STT', 'PPG', 'GDDY', 'MPWR', 'ON', 'NVR', 'DOV', 'FTV', 'TROW', 'BR', 'KHC', 'NTAP', 'SW', 'CCL', 'SYF', 'MTD', 'TYL', 'VLTO', 'PHM', 'CHD', 'BRO', 'HSY', 'AWK', 'EQT', 'HBAN', 'VTR', 'HAL', 'CPAY', 'TPL', 'EQR', 'DTE', 'HUBB', 'PPL', 'ADM', 'AEE', 'CINF', 'PTC', 'CDW', 'RF', 'WBD', 'EXPE', 'SBAC', 'WST', 'WDC', 'BIIB', 'WAT', 'WY', 'IFF', 'TDY', 'SMCI', 'ATO', 'ZBH', 'LDOS', 'DVN', 'NTRS', 'K', 'PKG', 'LYV', 'ES', 'CBOE', 'STE', 'ZBRA', 'CFG', 'FE', 'FSLR', 'STX', 'CLX', 'CNP', 'NRG', 'LUV', 'BLDR', 'ULTA', 'OMC', 'DRI', 'CMS', 'LYB', 'IP', 'COO', 'STLD', 'LH', 'MKC', 'TER', 'ESS', 'LVS', 'INVH', 'WRB', 'SNA', 'PODD', 'MAA', 'EL', 'CTRA', 'TRMB', 'FDS', 'PFG', 'DG', 'TSN', 'PNR', 'MAS', 'DGX', 'KEY', 'HOLX', 'IEX', 'BALL', 'BBY', 'MOH', 'J', 'GPC', 'KIM', 'GEN', 'EXPD', 'NI', 'ALGN', 'AVY', 'BAX', 'ARE', 'EG', 'DPZ', 'VRSN', 'CF', 'L', 'LNT', 'TXT', 'JBL', 'VTRS', 'APTV', 'DOC', 'MRNA', 'FFIV', 'AKAM', 'AMCR', 'JBHT', 'DLTR', 'EVRG', 'RVTY', 'TPR', 'POOL', 'SWKS', 'EPAM', 'ROL', 'NDSN', 'UDR', 'KMX', 'HST', 'CAG', 'SWK', 'CPT', 'JKHY', 'DAY', 'SJM', 'CHRW', 'ALB', 'ALLE', 'NCLH', 'INCY', 'REG', 'JNPR', 'BG', 'EMN', 'TECH', 'BXP', 'AIZ', 'UHS', 'PAYC', 'CTLT', 'LW', 'NWSA', 'IPG', 'GNRC', 'TAP', 'FOXA', 'PNW', 'ERIE', 'LKQ', 'CRL', 'ENPH', 'SOLV', 'HRL', 'GL', 'AES', 'HSIC', 'RL', 'MKTX', 'WYNN', 'AOS', 'TFX', 'HAS', 'FRT', 'MTCH', 'MGM', 'CPB', 'MOS', 'BF.B', 'CZR', 'IVZ', 'APA', 'CE', 'BWA', 'DVA', 'HII', 'FMC', 'MHK', 'BEN', 'PARA', 'QRVO', 'WBA', 'FOX', 'NWS', 'AMTM']
-    
-    try:
-        trading_date = event if isinstance(event, str) else get_previous_trading_date()
+def calculate_concentration_metrics(market_data):
+    """
+    Builds rankings and concentration metrics from the collected companies.
+
+    Uses market_data['companies'] and the S&P 500 total in
+    market_data['sp500_details'], updating market_data in place. Shared by
+    collection and repair so both produce identical metrics.
+
+    Args:
+        market_data (dict): Day document with companies and sp500_details
+    """
+    sp500_total_market_cap = market_data['sp500_details']['total_market_cap']
+    total_mag7_market_cap = 0
+    company_data = []
+
+    for ticker, company in market_data['companies'].items():
+        total_mag7_market_cap += company['market_cap']
+        company_data.append({
+            'ticker': ticker,
+            'name': company['name'],
+            'market_cap': company['market_cap'],
+            'pct_of_mag7': None
+        })
+
+    # Calculate percentages and create rankings
+    if company_data:
+        sorted_companies = sorted(company_data, key=lambda x: x['market_cap'], reverse=True)
+        
+        for company in sorted_companies:
+            company['pct_of_mag7'] = (company['market_cap'] / total_mag7_market_cap) * 100
+            if sp500_total_market_cap > 0:
+                company['pct_of_sp500'] = (company['market_cap'] / sp500_total_market_cap) * 100
         
-        # Initialize our data structure
-        market_data = {
-            'trading_date': trading_date,
-            'data_collection_time': datetime.now(ZoneInfo("America/New_York")).isoformat(),
-            'companies': {},
-            'rankings': {},
-            'concentration_metrics': {}
+        market_data['rankings'] = {
+            'by_market_cap': sorted_companies
         }
         
-        # Get S&P 500 market cap data first
+        # Store concentration metrics
+        market_data['concentration_metrics'] = {
+            'total_mag7_market_cap': total_mag7_market_cap,
+            'sp500_total_market_cap': sp500_total_market_cap,
+            'mag7_pct_of_sp500': (total_mag7_market_cap / sp500_total_market_cap * 100) if sp500_total_market_cap > 0 else 0,
+            'collection_date': market_data['trading_date'],
+            'mag7_companies_count': len(market_data['companies'])
+        }
+
+def summarize_market_data(market_data):
+    """
+    Returns the human-readable summary reported in the handler response.
+    """
+    sp500_total_market_cap = market_data['sp500_details']['total_market_cap']
+    total_mag7_market_cap = market_data.get('concentration_metrics', {}).get('total_mag7_market_cap', 0)
+    rankings = market_data.get('rankings', {}).get('by_market_cap', [])
+
+    return {
+        'trading_date': market_data['trading_date'],
+        'companies_collected': len(market_data['companies']),
+        'total_mag7_market_cap': f"${total_mag7_market_cap / 1e12:.2f}T",
+        'sp500_total_market_cap': f"${sp500_total_market_cap / 1e12:.2f}T",
+        'mag7_pct_of_sp500': f"{(total_mag7_market_cap / sp500_total_market_cap * 100):.1f}%" if sp500_total_market_cap > 0 else "N/A",
+        'top_company': rankings[0]['name'] if rankings else None
+    }
+
+def collect_trading_date(client, s3, trading_date, magnificent_7, sp500_tickers,
+                         ranged_aggs=None, shares_cache=None, manifest=None):
+    """
+    Collects market data for one trading date and stores it in its S3 partition.
+
+    With a manifest, tickers already collected for the date are reused rather
+    than refetched, and a date whose manifest is complete is skipped.
+
+    Args:
+        client: Polygon.io REST client
+        s3: boto3 S3 client
+        trading_date (str): Date in YYYY-MM-DD format
+        magnificent_7 (list): Magnificent 7 ticker symbols
+        sp500_tickers (list): S&P 500 constituent ticker symbols
+        ranged_aggs (dict): Optional get_stock_aggs_range output keyed by
+            ticker then date, used instead of per-day aggregate requests
+        shares_cache (SharesOutstandingCache): Optional shares outstanding cache
+        manifest (CollectionManifest): Optional loaded manifest for the date
+
+    Returns:
+        dict: S3 key and summary of the collected day
+    """
+    s3_key = f"raw/magnificent7/trading_date={trading_date}/market_data.json"
+
+    if manifest is not None and manifest.complete:
+        print(f"Skipping {trading_date}, already collected")
+        return {
+            's3_key': s3_key,
+            'summary': manifest.summary,
+            'skipped': True
+        }
+
+    # Initialize our data structure
+    market_data = {
+        'trading_date': trading_date,
+        'data_collection_time': datetime.now(ZoneInfo("America/New_York")).isoformat(),
+        'companies': {},
+        'rankings': {},
+        'concentration_metrics': {}
+    }
+    
+    # One grouped-daily request covers every ticker's daily bar
+    aggs_index = None
+    if USE_GROUPED_DAILY:
+        aggs_index = get_grouped_daily_aggs(client, trading_date)
+
+    # Market cap from cached shares needs unadjusted closes
+    price_index = None
+    if shares_cache is not None:
+        price_index = build_price_index(
+            aggs_index, get_grouped_daily_aggs(client, trading_date, adjusted=False)
+        )
+
+    # Get S&P 500 market cap data first
+    if manifest is not None:
+        # Only fetch constituents not already collected for this date
+        pending = manifest.pending_sp500(sp500_tickers)
+        print(f"{len(sp500_tickers) - len(pending)} constituents already collected for {trading_date}")
+        if pending:
+            # Results are checkpointed as they arrive, so a timeout partway
+            # through only loses the tickers since the last save
+            get_sp500_total_market_cap(
+                client, pending, trading_date,
+                price_index=price_index, shares_cache=shares_cache,
+                on_result=manifest.sp500_recorder()
+            )
+            manifest.save()
+        sp500_total_market_cap, processed_sp500, failed_sp500 = manifest.sp500_results(sp500_tickers)
+    else:
         sp500_total_market_cap, processed_sp500, failed_sp500 = get_sp500_total_market_cap(
-            client, sp500_tickers, trading_date
+            client, sp500_tickers, trading_date,
+            price_index=price_index, shares_cache=shares_cache
         )
-        
-        # Store S&P 500 details
-        market_data['sp500_details'] = {
-            'total_market_cap': sp500_total_market_cap,
-            'processed_count': len(processed_sp500),
-            'failed_count': len(failed_sp500),
-            'failed_tickers': failed_sp500
+    
+    # Store S&P 500 details
+    market_data['sp500_details'] = {
+        'total_market_cap': sp500_total_market_cap,
+        'processed_count': len(processed_sp500),
+        'failed_count': len(failed_sp500),
+        'failed_tickers': failed_sp500
+    }
+
+    # In grouped mode price data for all constituents is stored at no
+    # extra API cost
+    if AGGS_MODE == 'grouped':
+        market_data['sp500_trading_data'] = {
+            ticker: stock_data
+            for ticker in sp500_tickers
+            if (stock_data := aggs_index.get(get_historical_ticker_aggs(ticker, trading_date)))
         }
-        
-        # Collect data for each Magnificent 7 company
-        total_mag7_market_cap = 0
-        company_data = []
-        
-        for ticker in magnificent_7:
-            print(f"Processing {ticker}...")
-            
-            details = get_company_details(client, ticker, trading_date)
-            stock_data = get_stock_aggs(client, ticker, trading_date)
-            
-            if details and stock_data and details.get('market_cap'):
-                company_info = {
-                    **details,
-                    'trading_data': stock_data
-                }
-                
-                market_data['companies'][ticker] = company_info
-                total_mag7_market_cap += details['market_cap']
-                
-                company_data.append({
-                    'ticker': ticker,
-                    'name': details['name'],
-                    'market_cap': details['market_cap'],
-                    'pct_of_mag7': None
-                })
-                print(f"Successfully processed {ticker}")
+    
+    # Collect data for each Magnificent 7 company
+    for ticker in magnificent_7:
+        print(f"Processing {ticker}...")
+
+        stored = manifest.get_mag7(ticker) if manifest is not None else None
+        if stored:
+            details, stock_data = stored
+        else:
+            details = get_company_details(client, ticker, trading_date, price_index, shares_cache)
+            # Bars come from the grouped-daily index whenever it was fetched;
+            # if that request failed, fall back to per-ticker requests
+            if aggs_index:
+                stock_data = lookup_stock_aggs(aggs_index, ticker, trading_date)
+            elif ranged_aggs is not None:
+                stock_data = ranged_aggs.get(ticker, {}).get(trading_date)
+                if stock_data is None:
+                    print(f"No aggregate data available for stock {ticker} on {trading_date}")
             else:
-                print(f"Skipping {ticker} due to missing data")
+                stock_data = get_stock_aggs(client, ticker, trading_date)
+
+            if manifest is not None:
+                manifest.record_mag7(ticker, details, stock_data)
         
-        # Calculate percentages and create rankings
-        if company_data:
-            sorted_companies = sorted(company_data, key=lambda x: x['market_cap'], reverse=True)
-            
-            for company in sorted_companies:
-                company['pct_of_mag7'] = (company['market_cap'] / total_mag7_market_cap) * 100
-                if sp500_total_market_cap > 0:
-                    company['pct_of_sp500'] = (company['market_cap'] / sp500_total_market_cap) * 100
-            
-            market_data['rankings'] = {
-                'by_market_cap': sorted_companies
-            }
-            
-            # Store concentration metrics
-            market_data['concentration_metrics'] = {
-                'total_mag7_market_cap': total_mag7_market_cap,
-                'sp500_total_market_cap': sp500_total_market_cap,
-                'mag7_pct_of_sp500': (total_mag7_market_cap / sp500_total_market_cap * 100) if sp500_total_market_cap > 0 else 0,
-                'collection_date': trading_date,
-                'mag7_companies_count': len(market_data['companies'])
+        if details and stock_data and details.get('market_cap'):
+            market_data['companies'][ticker] = {
+                **details,
+                'trading_data': stock_data
             }
-        
-        # Store in S3
-        s3_key = f"raw/magnificent7/trading_date={trading_date}/market_data.json"
-        
-        s3.put_object(
-            Bucket=os.environ['DATA_BUCKET'],
-            Key=s3_key,
-            Body=json.dumps(market_data, indent=2)
-        )
-        
+            print(f"Successfully processed {ticker}")
+        else:
+            print(f"Skipping {ticker} due to missing data")
+    
+    calculate_concentration_metrics(market_data)
+    
+    # Store in S3
+    s3.put_object(
+        Bucket=os.environ['DATA_BUCKET'],
+        Key=s3_key,
+        Body=json.dumps(market_data, indent=2)
+    )
+
+    if WRITE_PARQUET:
+        # Imported lazily so JSON-only deployments don't need pyarrow in the layer
+        from parquet_writer import write_parquet_tables
+        write_parquet_tables(s3, os.environ['DATA_BUCKET'], market_data, processed_sp500)
+    
+    summary = summarize_market_data(market_data)
+
+    if manifest is not None:
+        manifest.mark_complete(summary, sp500_tickers)
+
+    return {
+        's3_key': s3_key,
+        'summary': summary
+    }
+
+def repair_trading_date(client, s3, trading_date, magnificent_7, manifest=None, universe=None):
+    """
+    Refetches only what failed for an already collected trading date.
+
+    Reads the stored day document, retries the S&P 500 constituents listed in
+    sp500_details.failed_tickers and any missing Magnificent 7 companies, then
+    updates the S&P 500 total and concentration metrics and rewrites the
+    partition. A day with 5 failures costs 5 requests instead of a full rerun.
+
+    Args:
+        client: Polygon.io REST client
+        s3: boto3 S3 client
+        trading_date (str): Date in YYYY-MM-DD format
+        magnificent_7 (list): Magnificent 7 ticker symbols
+        manifest (CollectionManifest): Optional loaded manifest for the date
+        universe (UniverseIndex): Optional universe index; failed tickers that
+            were not members (or not yet listed) on the date are dropped
+            instead of retried
+
+    Returns:
+        dict: S3 key, repaired ticker counts and summary of the day
+    """
+    s3_key = f"raw/magnificent7/trading_date={trading_date}/market_data.json"
+
+    try:
+        response = s3.get_object(Bucket=os.environ['DATA_BUCKET'], Key=s3_key)
+    except s3.exceptions.NoSuchKey:
+        print(f"No collected data to repair for {trading_date}")
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Data successfully collected',
-                's3_key': s3_key,
-                'summary': {
-                    'trading_date': trading_date,
-                    'companies_collected': len(market_data['companies']),
-                    'total_mag7_market_cap': f"${total_mag7_market_cap / 1e12:.2f}T",
-                    'sp500_total_market_cap': f"${sp500_total_market_cap / 1e12:.2f}T",
-                    'mag7_pct_of_sp500': f"{(total_mag7_market_cap / sp500_total_market_cap * 100):.1f}%" if sp500_total_market_cap > 0 else "N/A",
-                    'top_company': sorted_companies[0]['name'] if company_data else None
-                }
-            }, indent=2)
+            's3_key': s3_key,
+            'error': 'Trading date has not been collected'
         }
+
+    market_data = json.loads(response['Body'].read())
+    sp500_details = market_data['sp500_details']
+
+    # Retry only the constituents that failed and were members on the date.
+    # Pre-IPO or removed tickers would fail again on every repair.
+    universe = universe or default_universe_index
+    failed = []
+    not_members = []
+    for entry in sp500_details['failed_tickers']:
+        ticker = entry['ticker']
+        # Without an index only the known listing dates can be checked
+        if universe.is_member(ticker, trading_date) if universe.members else universe.is_listed(ticker, trading_date):
+            failed.append(ticker)
+        else:
+            not_members.append(ticker)
+
+    if not_members:
+        print(f"Dropping {len(not_members)} tickers that were not listed constituents on {trading_date}: "
+              f"{', '.join(not_members)}")
+        sp500_details['failed_tickers'] = [
+            entry for entry in sp500_details['failed_tickers'] if entry['ticker'] not in not_members
+        ]
+        sp500_details['failed_count'] = len(sp500_details['failed_tickers'])
+        if manifest is not None:
+            for ticker in not_members:
+                manifest.sp500.pop(ticker, None)
+
+    recovered_sp500 = []
+    if failed:
+        recovered_market_cap, recovered_sp500, still_failed = get_sp500_total_market_cap(
+            client, failed, trading_date,
+            on_result=manifest.sp500_recorder() if manifest is not None else None
+        )
+        sp500_details['total_market_cap'] += recovered_market_cap
+        sp500_details['processed_count'] += len(recovered_sp500)
+        sp500_details['failed_count'] = len(still_failed)
+        sp500_details['failed_tickers'] = still_failed
+
+    # Retry any Magnificent 7 company that was skipped
+    missing_mag7 = [ticker for ticker in magnificent_7 if ticker not in market_data['companies']]
+    recovered_mag7 = []
+    for ticker in missing_mag7:
+        print(f"Processing {ticker}...")
+        details = get_company_details(client, ticker, trading_date)
+        stock_data = get_stock_aggs(client, ticker, trading_date)
+
+        if manifest is not None:
+            manifest.record_mag7(ticker, details, stock_data)
+
+        if details and stock_data and details.get('market_cap'):
+            market_data['companies'][ticker] = {
+                **details,
+                'trading_data': stock_data
+            }
+            recovered_mag7.append(ticker)
+            print(f"Successfully processed {ticker}")
+        else:
+            print(f"Skipping {ticker} due to missing data")
+
+    calculate_concentration_metrics(market_data)
+    market_data['data_repair_time'] = datetime.now(ZoneInfo("America/New_York")).isoformat()
+
+    s3.put_object(
+        Bucket=os.environ['DATA_BUCKET'],
+        Key=s3_key,
+        Body=json.dumps(market_data, indent=2)
+    )
+
+    summary = summarize_market_data(market_data)
+
+    if manifest is not None:
+        manifest.mark_complete(summary)
+
+    if WRITE_PARQUET:
+        from parquet_writer import write_parquet_tables
+        # Only the manifest holds every constituent's market cap, which the
+        # sp500_constituents table needs and the day document does not keep;
+        # without it that table is left as it was and the rest are rewritten
+        processed_sp500 = None
+        if manifest is not None:
+            processed_sp500 = manifest.sp500_results([*manifest.sp500])[1]
+        write_parquet_tables(s3, os.environ['DATA_BUCKET'], market_data, processed_sp500)
+
+    print(f"Repaired {trading_date}: {len(recovered_sp500)} of {len(failed)} constituents, "
+          f"{len(recovered_mag7)} of {len(missing_mag7)} Magnificent 7 companies")
+
+    return {
+        's3_key': s3_key,
+        'repaired': {
+            'sp500_recovered': len(recovered_sp500),
+            'sp500_still_failed': sp500_details['failed_count'],
+            'sp500_not_members': not_members,
+            'mag7_recovered': recovered_mag7
+        },
+        'summary': summary
+    }
+
+_polygon_client = None
+_s3_client = None
+
+def get_polygon_client():
+    """
+    Returns the Polygon client, created once per container so warm
+    invocations reuse its pooled connections.
+
+    Retries are handled by call_polygon rather than inside the client, and
+    its hot-path calls are timed by the invocation metrics.
+    """
+    global _polygon_client
+    if _polygon_client is None:
+        client = RESTClient(os.environ['POLYGON_API_KEY'], base=POLYGON_BASE_URL)
+        # urllib3 keeps one connection per host by default; keep one per
+        # worker thread so concurrent requests don't reconnect every time
+        client.client.connection_pool_kw['maxsize'] = POLYGON_MAX_WORKERS
+        _polygon_client = metrics.instrument_client(raise_for_status(client))
+    return _polygon_client
+
+def get_s3_client():
+    """
+    Returns the S3 client used for all reads and writes, created once per
+    container.
+
+    The local backfill runner replaces this to store data on disk.
+    """
+    global _s3_client
+    if _s3_client is None:
+        # Imported here so runs against local storage never load boto3
+        import boto3
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+def respond(status_code, body):
+    """
+    Builds the handler response with the invocation's metrics summary, and
+    writes the metrics to the log in EMF.
+    """
+    metrics.emit()
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({**body, 'metrics': metrics.summary()}, indent=2)
+    }
+
+def lambda_handler(event, context):
+    metrics.reset()
+
+    # Clients are created once per container and reused by warm invocations
+    client = get_polygon_client()
+    s3 = metrics.instrument_s3(get_s3_client())
+
+    try:
+        trading_dates = get_trading_dates(event)
+
+        # Exchange holidays return no data, so don't spend ~510 requests on them
+        calendar = get_calendar()
+        closed_dates = [trading_date for trading_date in trading_dates if not calendar.is_session(trading_date)]
+        if closed_dates:
+            print(f"Skipping non-trading dates: {', '.join(closed_dates)}")
+            trading_dates = [trading_date for trading_date in trading_dates if calendar.is_session(trading_date)]
+
+        if not trading_dates:
+            return respond(200, {
+                'message': 'No trading sessions to collect',
+                'skipped_dates': closed_dates
+            })
+
+        # Constituents and symbol changes by date, so tickers that were not
+        # yet listed are never requested. Before the index's first snapshot
+        # the denominator only includes earlier members if the index was
+        # seeded with their changes. Loaded before any mode runs, so symbol
+        # lookups in every mode use the index from UNIVERSE_INDEX_KEY when set.
+        universe = get_universe_index(s3, os.environ['DATA_BUCKET'])
+
+        # {"mode": "intraday", "timespan": "minute", ...} streams Mag 7 bars
+        # instead of collecting the daily documents
+        if isinstance(event, dict) and event.get('mode') == 'intraday':
+            timespan = event.get('timespan', 'minute')
+            if timespan not in MINUTES_PER_TIMESPAN:
+                raise ValueError(f"Unsupported intraday timespan: {timespan}")
+
+            results = collect_intraday(
+                client, s3, trading_dates, event.get('tickers', MAGNIFICENT_7),
+                timespan=timespan, multiplier=int(event.get('multiplier', 1))
+            )
+            return respond(200, {
+                'message': f'Collected {timespan} bars for {len(trading_dates)} trading dates',
+                'results': results
+            })
+
+        # {"mode": "repair", ...} retries only the failed tickers of stored days
+        if isinstance(event, dict) and event.get('mode') == 'repair':
+            results = []
+            for trading_date in trading_dates:
+                print(f"Repairing {trading_date}...")
+                manifest = None
+                if USE_MANIFEST:
+                    manifest = CollectionManifest(trading_date, s3, os.environ['DATA_BUCKET']).load()
+                results.append(repair_trading_date(client, s3, trading_date, MAGNIFICENT_7, manifest, universe))
+
+            return respond(200, {
+                'message': f'Repaired {len(results)} trading dates',
+                'results': results
+            })
+
+        # Loaded once per invocation and shared by every date in the batch
+        shares_cache = None
+        if MARKET_CAP_SOURCE == 'shares_cache':
+            shares_cache = SharesOutstandingCache(
+                path=SHARES_CACHE_PATH, s3=s3, bucket=os.environ['DATA_BUCKET'], key=SHARES_CACHE_KEY
+            ).load()
+
+        # Pass {"force": true} to recollect dates the manifest marks complete
+        force = isinstance(event, dict) and event.get('force', False)
+
+        manifests = {}
+        if USE_MANIFEST:
+            for trading_date in trading_dates:
+                manifest = CollectionManifest(trading_date, s3, os.environ['DATA_BUCKET'])
+                if force:
+                    # Clear the marker first, so a forced run that stops
+                    # partway leaves the date pending
+                    manifest.reset()
+                else:
+                    manifest.load()
+                manifests[trading_date] = manifest
+
+        # For batches, fetch each Mag 7 ticker's bars for the whole range at
+        # once, leaving out dates that are already complete
+        pending_dates = [
+            trading_date for trading_date in trading_dates
+            if not (trading_date in manifests and manifests[trading_date].complete)
+        ]
+        ranged_aggs = None
+        if len(pending_dates) > 1 and not USE_GROUPED_DAILY:
+            ranged_aggs = {
+                ticker: get_stock_aggs_range(client, ticker, pending_dates)
+                for ticker in MAGNIFICENT_7
+            }
+
+        results = []
+        for trading_date in trading_dates:
+            print(f"Collecting {trading_date}...")
+            constituents = universe.constituents(trading_date) if universe else SP500_TICKERS
+            results.append(collect_trading_date(
+                client, s3, trading_date, MAGNIFICENT_7, constituents,
+                ranged_aggs=ranged_aggs, shares_cache=shares_cache,
+                manifest=manifests.get(trading_date)
+            ))
+
+        if shares_cache is not None:
+            shares_cache.save()
+
+        # Single-date events keep the original response shape
+        if len(results) == 1:
+            body = {
+                'message': 'Data successfully collected',
+                **results[0]
+            }
+        else:
+            body = {
+                'message': f'Data successfully collected for {len(results)} trading dates',
+                'results': results
+            }
+
+        return respond(200, body)
         
     except Exception as e:
         print(f"Error in lambda_handler: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'error': str(e),
-                'trading_date': trading_date if 'trading_date' in locals() else None
-            })
-        }
\ No newline at end of file
+        return respond(500, {
+            'error': str(e),
+            'trading_date': trading_date if 'trading_date' in locals() else None
+        })
@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+# Metrics are written to the function's log as CloudWatch Embedded Metric
+# Format, which CloudWatch turns into metrics without any API calls.
+EMIT_METRICS = os.environ.get('EMIT_METRICS', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Magnificent7/Collector')
+FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'magnificent7-historical-data-collector')
+
+# Upper bounds of the latency histogram buckets, in milliseconds. EMF accepts
+# at most 100 distinct values per metric, so durations are bucketed.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Polygon client calls wrapped by instrument_client
+INSTRUMENTED_CALLS = ('get_ticker_details', 'get_aggs', 'get_grouped_daily_aggs')
+
+def bucket_ms(seconds):
+    milliseconds = seconds * 1000
+    for bound in LATENCY_BUCKETS_MS:
+        if milliseconds <= bound:
+            return bound
+    return LATENCY_BUCKETS_MS[-1]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))]
+
+class InvocationMetrics:
+    """
+    Thread-safe timings and counters for one collector invocation.
+
+    Timings are kept per operation (Polygon endpoint, rate-limit wait,
+    put_object) and reported as a latency summary in the handler's response
+    and as an EMF histogram in the log. Counters cover retries, throttled
+    responses and bytes written.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all metrics; called at the start of each invocation.
+        """
+        with self.lock:
+            self.started = time.perf_counter()
+            self.timings = {}
+            self.errors = {}
+            self.counters = {}
+
+    def observe(self, name, seconds, error=False):
+        with self.lock:
+            self.timings.setdefault(name, []).append(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, name, function):
+        """
+        Wraps a function so each call's duration and failure are recorded.
+        """
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = False
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.observe(name, time.perf_counter() - started, error)
+        return wrapper
+
+    def instrument_client(self, client):
+        """
+        Times a Polygon RESTClient's calls and counts the HTTP requests it
+        sends. Retries and 429 responses are counted by call_with_retry.
+
+        Returns:
+            The same client, instrumented in place
+        """
+        for name in INSTRUMENTED_CALLS:
+            setattr(client, name, self.timed(name, getattr(client, name)))
+
+        pool = client.client
+        request = pool.request
+
+        @wraps(request)
+        def counted_request(*args, **kwargs):
+            self.count('api_requests')
+            return request(*args, **kwargs)
+
+        pool.request = counted_request
+        return client
+
+    def instrument_s3(self, s3):
+        """
+        Times an S3 client's put_object calls and counts the bytes written.
+
+        Returns:
+            The same client, instrumented in place
+        """
+        # Reused clients are only instrumented once
+        if getattr(s3.put_object, 'instrumented', False):
+            return s3
+
+        put_object = self.timed('put_object', s3.put_object)
+
+        @wraps(put_object)
+        def counted_put_object(**kwargs):
+            body = kwargs.get('Body', b'')
+            self.count('bytes_written', len(body.encode() if isinstance(body, str) else body))
+            return put_object(**kwargs)
+
+        counted_put_object.instrumented = True
+        s3.put_object = counted_put_object
+        return s3
+
+    def summary(self):
+        """
+        Returns per-operation latency statistics and counters.
+
+        Returns:
+            dict: {'elapsed_seconds', 'operations': {name: {...}}, 'counters': {...}}
+        """
+        with self.lock:
+            timings = {name: sorted(values) for name, values in self.timings.items()}
+            errors = dict(self.errors)
+            counters = dict(self.counters)
+            elapsed = time.perf_counter() - self.started
+
+        operations = {}
+        for name, values in timings.items():
+            operations[name] = {
+                'count': len(values),
+                'errors': errors.get(name, 0),
+                'total_seconds': round(sum(values), 3),
+                'p50_ms': round(percentile(values, 0.5) * 1000, 1),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+                'max_ms': round(values[-1] * 1000, 1)
+            }
+
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'operations': operations,
+            'counters': counters
+        }
+
+    def to_emf(self):
+        """
+        Builds a CloudWatch Embedded Metric Format document for the invocation.
+        """
+        with self.lock:
+            timings = {name: list(values) for name, values in self.timings.items()}
+            errors = dict(self.errors)
+            counters = dict(self.counters)
+            elapsed = time.perf_counter() - self.started
+
+        definitions = [{'Name': 'InvocationSeconds', 'Unit': 'Seconds'}]
+        document = {'FunctionName': FUNCTION_NAME, 'InvocationSeconds': elapsed}
+
+        for name, values in timings.items():
+            histogram = {}
+            for seconds in values:
+                bound = bucket_ms(seconds)
+                histogram[bound] = histogram.get(bound, 0) + 1
+
+            definitions += [
+                {'Name': f'{name}.Latency', 'Unit': 'Milliseconds'},
+                {'Name': f'{name}.Seconds', 'Unit': 'Seconds'},
+                {'Name': f'{name}.Errors', 'Unit': 'Count'}
+            ]
+            document[f'{name}.Latency'] = {'Values': list(histogram), 'Counts': list(histogram.values())}
+            document[f'{name}.Seconds'] = sum(values)
+            document[f'{name}.Errors'] = errors.get(name, 0)
+
+        for name, value in counters.items():
+            definitions.append({'Name': name, 'Unit': 'Bytes' if name == 'bytes_written' else 'Count'})
+            document[name] = value
+
+        document['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['FunctionName']],
+                'Metrics': definitions
+            }]
+        }
+        return document
+
+    def emit(self):
+        """
+        Writes the EMF document to the log as a single JSON line.
+        """
+        if EMIT_METRICS:
+            print(json.dumps(self.to_emf()))
+
+# Shared by the handler and the worker threads of the current invocation
+metrics = InvocationMetrics()
@@ -0,0 +1,277 @@
+import io
+import json
+import os
+import re
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Prefix for columnar output. Daily files land under daily/, compacted
+# files under compacted_monthly/ or compacted_yearly/, one directory per
+# table. The two granularities use separate prefixes so a table pointed at
+# either one never reads the same rows twice.
+PARQUET_PREFIX = os.environ.get('PARQUET_PREFIX', 'parquet')
+
+COMPACTION_PERIOD = re.compile(r'^(\d{4})(-(0[1-9]|1[0-2]))?$')
+PARTITION_DATE = re.compile(r'trading_date=(\d{4}-\d{2}-\d{2})')
+
+# Daily files are partitioned by trading_date, so the column is left out of
+# them: Glue and Athena reject a table whose partition key is also a data
+# column. Compacted files are partitioned by month or year and keep it.
+PARTITION_COLUMN = 'trading_date'
+
+# Flat schemas matching the Redshift tables in table_definitions.ipynb, so
+# files can be queried by Athena without the stack() unpivot the Glue jobs
+# need for the nested JSON. Only the compacted files carry every column of
+# those tables; COPY ... FORMAT AS PARQUET must read compacted_monthly/ or
+# compacted_yearly/, since the daily files lack trading_date.
+SCHEMAS = {
+    'daily_trading': pa.schema([
+        ('trading_date', pa.string()),
+        ('ticker', pa.string()),
+        ('open_price', pa.float64()),
+        ('high_price', pa.float64()),
+        ('low_price', pa.float64()),
+        ('close_price', pa.float64()),
+        ('volume', pa.int64()),
+        ('vwap', pa.float64())
+    ]),
+    'company_details': pa.schema([
+        ('trading_date', pa.string()),
+        ('ticker', pa.string()),
+        ('company_name', pa.string()),
+        ('market_cap', pa.float64()),
+        ('shares_outstanding', pa.float64()),
+        ('currency', pa.string()),
+        ('description', pa.string())
+    ]),
+    'concentration_metrics': pa.schema([
+        ('trading_date', pa.string()),
+        ('total_mag7_market_cap', pa.float64()),
+        ('sp500_total_market_cap', pa.float64()),
+        ('mag7_pct_of_sp500', pa.float64()),
+        ('mag7_companies_count', pa.int32())
+    ]),
+    'sp500_constituents': pa.schema([
+        ('trading_date', pa.string()),
+        ('ticker', pa.string()),
+        ('market_cap', pa.float64()),
+        ('open_price', pa.float64()),
+        ('high_price', pa.float64()),
+        ('low_price', pa.float64()),
+        ('close_price', pa.float64()),
+        ('volume', pa.int64()),
+        ('vwap', pa.float64()),
+        ('failure_reason', pa.string())
+    ])
+}
+
+def flatten_market_data(market_data, processed_sp500=None):
+    """
+    Flattens one day's nested market_data document into rows per table.
+
+    Args:
+        market_data (dict): Document written to raw/magnificent7/
+        processed_sp500 (list): Optional processed_tickers from the S&P 500
+            loop, which carry per-constituent market caps not kept in the JSON
+
+    Returns:
+        dict: Lists of row dicts keyed by table name
+    """
+    trading_date = market_data['trading_date']
+    tables = {name: [] for name in SCHEMAS}
+
+    for ticker, company in market_data.get('companies', {}).items():
+        trading_data = company.get('trading_data') or {}
+        tables['daily_trading'].append({
+            'trading_date': trading_date,
+            'ticker': ticker,
+            'open_price': trading_data.get('open_price'),
+            'high_price': trading_data.get('high_price'),
+            'low_price': trading_data.get('low_price'),
+            'close_price': trading_data.get('close_price'),
+            'volume': trading_data.get('volume'),
+            'vwap': trading_data.get('vwap')
+        })
+        tables['company_details'].append({
+            'trading_date': trading_date,
+            'ticker': ticker,
+            'company_name': company.get('name'),
+            'market_cap': company.get('market_cap'),
+            'shares_outstanding': company.get('shares_outstanding'),
+            'currency': company.get('currency'),
+            'description': company.get('description')
+        })
+
+    metrics = market_data.get('concentration_metrics') or {}
+    if metrics.get('total_mag7_market_cap') is not None:
+        tables['concentration_metrics'].append({
+            'trading_date': trading_date,
+            'total_mag7_market_cap': metrics.get('total_mag7_market_cap'),
+            'sp500_total_market_cap': metrics.get('sp500_total_market_cap'),
+            'mag7_pct_of_sp500': metrics.get('mag7_pct_of_sp500'),
+            'mag7_companies_count': metrics.get('mag7_companies_count')
+        })
+
+    # Constituent rows combine market caps, any stored daily bars and failures
+    constituents = {}
+    for entry in processed_sp500 or []:
+        constituents[entry['ticker']] = {'market_cap': entry['market_cap']}
+    for entry in (market_data.get('sp500_details') or {}).get('failed_tickers', []):
+        constituents[entry['ticker']] = {'failure_reason': entry.get('reason')}
+    for ticker, trading_data in (market_data.get('sp500_trading_data') or {}).items():
+        constituents.setdefault(ticker, {}).update(trading_data)
+
+    for ticker, values in sorted(constituents.items()):
+        tables['sp500_constituents'].append({
+            'trading_date': trading_date,
+            'ticker': ticker,
+            'market_cap': values.get('market_cap'),
+            'open_price': values.get('open_price'),
+            'high_price': values.get('high_price'),
+            'low_price': values.get('low_price'),
+            'close_price': values.get('close_price'),
+            'volume': values.get('volume'),
+            'vwap': values.get('vwap'),
+            'failure_reason': values.get('failure_reason')
+        })
+
+    return tables
+
+def daily_schema(table_name):
+    """
+    Returns the table's schema without the trading_date partition column.
+    """
+    schema = SCHEMAS[table_name]
+    return schema.remove(schema.get_field_index(PARTITION_COLUMN))
+
+def to_parquet_bytes(table_name, rows):
+    """
+    Serializes rows to Snappy-compressed Parquet using the table's daily
+    schema; the trading_date value of each row is dropped.
+    """
+    table = pa.Table.from_pylist(rows, schema=daily_schema(table_name))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='snappy')
+    return buffer.getvalue()
+
+def daily_key(table_name, trading_date):
+    return f"{PARQUET_PREFIX}/daily/{table_name}/trading_date={trading_date}/data.parquet"
+
+def write_parquet_tables(s3, bucket, market_data, processed_sp500=None):
+    """
+    Writes one day's flattened tables as Parquet next to the JSON document.
+
+    Args:
+        s3: boto3 S3 client
+        bucket (str): Destination bucket
+        market_data (dict): Document written to raw/magnificent7/
+        processed_sp500 (list): Optional processed_tickers from the S&P 500 loop
+
+    Returns:
+        list: S3 keys written
+    """
+    keys = []
+    for table_name, rows in flatten_market_data(market_data, processed_sp500).items():
+        if not rows:
+            continue
+
+        key = daily_key(table_name, market_data['trading_date'])
+        s3.put_object(Bucket=bucket, Key=key, Body=to_parquet_bytes(table_name, rows))
+        keys.append(key)
+
+    print(f"Wrote {len(keys)} Parquet tables for {market_data['trading_date']}")
+    return keys
+
+def read_daily_partition(s3, bucket, table_name, key):
+    """
+    Reads one daily file and restores its trading_date column from the key.
+
+    Returns:
+        pa.Table: Rows in the table's full schema
+    """
+    table = pq.read_table(io.BytesIO(s3.get_object(Bucket=bucket, Key=key)['Body'].read()))
+    # Files written before the column was dropped still carry it
+    if PARTITION_COLUMN in table.column_names:
+        table = table.drop_columns([PARTITION_COLUMN])
+
+    trading_date = PARTITION_DATE.search(key).group(1)
+    table = table.append_column(PARTITION_COLUMN, pa.array([trading_date] * table.num_rows, pa.string()))
+    return table.select(SCHEMAS[table_name].names).cast(SCHEMAS[table_name])
+
+def compact_partitions(s3, bucket, table_name, period):
+    """
+    Merges the daily Parquet partitions of one month or year into one file.
+
+    The compacted file is rewritten from all matching daily partitions each
+    time, so rerunning compaction after late or repaired days is safe.
+    Daily files are left in place; expire them with an S3 lifecycle rule.
+
+    Args:
+        s3: boto3 S3 client
+        bucket (str): Bucket holding the Parquet output
+        table_name (str): One of SCHEMAS
+        period (str): "YYYY-MM" for a month or "YYYY" for a year
+
+    Returns:
+        dict: Compacted S3 key and the number of days and rows merged
+    """
+    if not isinstance(period, str) or not COMPACTION_PERIOD.match(period):
+        raise ValueError(f"Invalid compaction period {period!r}, expected YYYY or YYYY-MM")
+
+    prefix = f"{PARQUET_PREFIX}/daily/{table_name}/trading_date={period}"
+    paginator = s3.get_paginator('list_objects_v2')
+    keys = sorted(
+        item['Key']
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for item in page.get('Contents', [])
+        if item['Key'].endswith('.parquet')
+    )
+
+    if not keys:
+        print(f"No daily {table_name} partitions found for {period}")
+        return {'s3_key': None, 'days': 0, 'rows': 0}
+
+    tables = [read_daily_partition(s3, bucket, table_name, key) for key in keys]
+    sort_keys = [(column, 'ascending') for column in ('trading_date', 'ticker') if column in SCHEMAS[table_name].names]
+    merged = pa.concat_tables(tables).sort_by(sort_keys)
+
+    if len(period) == 7:
+        compacted_key = f"{PARQUET_PREFIX}/compacted_monthly/{table_name}/month={period}/data.parquet"
+    else:
+        compacted_key = f"{PARQUET_PREFIX}/compacted_yearly/{table_name}/year={period}/data.parquet"
+
+    buffer = io.BytesIO()
+    pq.write_table(merged, buffer, compression='snappy')
+    s3.put_object(Bucket=bucket, Key=compacted_key, Body=buffer.getvalue())
+
+    print(f"Compacted {len(keys)} {table_name} partitions ({merged.num_rows} rows) into {compacted_key}")
+    return {'s3_key': compacted_key, 'days': len(keys), 'rows': merged.num_rows}
+
+def compaction_handler(event, context):
+    """
+    Lambda entry point for compaction.
+
+    Event:
+        {"period": "YYYY-MM" or "YYYY", "tables": [...] (defaults to all)}
+    """
+    period = event.get('period')
+    if not isinstance(period, str) or not COMPACTION_PERIOD.match(period):
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f"Invalid period {period!r}, expected YYYY or YYYY-MM"})
+        }
+
+    import boto3
+
+    s3 = boto3.client('s3')
+    tables = event.get('tables') or list(SCHEMAS)
+
+    results = {
+        table_name: compact_partitions(s3, os.environ['DATA_BUCKET'], table_name, period)
+        for table_name in tables
+    }
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(results, indent=2)
+    }
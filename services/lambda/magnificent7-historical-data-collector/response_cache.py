@@ -0,0 +1,70 @@
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import metrics
+
+# Entries kept across warm invocations. A day's ticker details for the whole
+# S&P 500 is ~510 entries of a few KB each.
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '2048'))
+
+class ResponseCache:
+    """
+    Bounded, thread-safe LRU cache of Polygon responses.
+
+    Keys are (endpoint, ticker, date) tuples, so the same historical request
+    made twice (the Mag 7 tickers are fetched in the S&P 500 pass and again
+    for company details) is only sent once. The cache lives at module level,
+    so warm invocations reuse it too; responses for a past trading date do
+    not change. Empty responses are not cached.
+
+    Args:
+        maxsize (int): Maximum entries before the least recently used is evicted,
+            0 disables the cache
+    """
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached response for key, or calls fetch() and caches its result.
+
+        Args:
+            key (tuple): (endpoint, ticker, date)
+            fetch: Zero-argument function that makes the request
+
+        Returns:
+            The cached or fetched response
+        """
+        value = self.get(key)
+        if value is not None:
+            metrics.count('response_cache_hits')
+            return value
+
+        metrics.count('response_cache_misses')
+        value = fetch()
+        if value:
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -0,0 +1,232 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import wraps
+
+from urllib3.exceptions import HTTPError as TransportError
+
+from metrics import metrics
+
+# Attempts per Polygon call, including the first. Transient failures (429,
+# 5xx, connection errors and timeouts) are retried; anything else is not.
+POLYGON_RETRY_ATTEMPTS = int(os.environ.get('POLYGON_RETRY_ATTEMPTS', '5'))
+POLYGON_RETRY_BASE_DELAY = float(os.environ.get('POLYGON_RETRY_BASE_DELAY', '1'))
+POLYGON_RETRY_MAX_DELAY = float(os.environ.get('POLYGON_RETRY_MAX_DELAY', '60'))
+
+# Consecutive transient failures, across all workers, that open the circuit
+# breaker, and how long it then pauses every request.
+CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_THRESHOLD', '10'))
+CIRCUIT_BREAKER_COOLDOWN = float(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', '30'))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Client errors that say nothing about the requested ticker: a bad API key or
+# plan fails every request and is fixed by configuration, not by giving up
+ACCOUNT_STATUSES = {401, 403}
+
+class PolygonHTTPError(Exception):
+    """
+    A non-200 response from the Polygon API.
+
+    Args:
+        status (int): HTTP status code
+        url (str): Requested URL, without the query string
+        body (str): Response body
+        retry_after (float): Seconds from the Retry-After header, if any
+    """
+    def __init__(self, status, url, body, retry_after=None):
+        super().__init__(f"HTTP {status} from {url}: {body[:200]}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status in RETRYABLE_STATUSES
+
+    @property
+    def permanent(self):
+        """
+        True for client errors, such as a 404 for a ticker that was not
+        listed on the date, that will fail again on every rerun.
+        """
+        return 400 <= self.status < 500 and self.status not in RETRYABLE_STATUSES | ACCOUNT_STATUSES
+
+def parse_retry_after(value):
+    """
+    Converts a Retry-After header (seconds or an HTTP date) to seconds.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def raise_for_status(client):
+    """
+    Sends each of a RESTClient's HTTP requests exactly once and raises
+    PolygonHTTPError for non-200 responses.
+
+    The client's built-in urllib3 retries sleep inside each worker thread and
+    drop the status and Retry-After header, so retries are left to
+    call_with_retry instead.
+
+    Returns:
+        The same client, modified in place
+    """
+    pool = client.client
+    request = pool.request
+
+    @wraps(request)
+    def checked_request(method, url, *args, **kwargs):
+        kwargs['retries'] = False
+        response = request(method, url, *args, **kwargs)
+        if response.status != 200:
+            raise PolygonHTTPError(
+                response.status,
+                url,
+                response.data.decode('utf-8', errors='replace'),
+                retry_after=parse_retry_after(response.headers.get('Retry-After'))
+            )
+        return response
+
+    pool.request = checked_request
+    return client
+
+def is_retryable(error):
+    if isinstance(error, PolygonHTTPError):
+        return error.retryable
+    return isinstance(error, TransportError)
+
+def backoff_delay(attempt):
+    """
+    Exponential backoff with full jitter for the given (1-based) attempt.
+    """
+    return random.uniform(0, min(POLYGON_RETRY_MAX_DELAY, POLYGON_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+class CircuitBreaker:
+    """
+    Pauses every worker thread when the API is throttling or failing globally.
+
+    A 429 pauses all requests for its Retry-After period (or a backoff delay),
+    since the rate limit applies to the whole API key. After `threshold`
+    consecutive transient failures the breaker opens and pauses all requests
+    for `cooldown` seconds; the first request after that is a probe, and one
+    more failure opens it again.
+
+    Args:
+        threshold (int): Consecutive failures that open the breaker
+        cooldown (float): Seconds the breaker stays open
+    """
+    def __init__(self, threshold=CIRCUIT_BREAKER_THRESHOLD, cooldown=CIRCUIT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait(self):
+        """
+        Blocks while the breaker is paused.
+
+        Returns:
+            float: Seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures < self.threshold:
+                return
+
+            # Stay one failure away from reopening until a request succeeds
+            self.consecutive_failures = self.threshold - 1
+            self.paused_until = max(self.paused_until, time.monotonic() + self.cooldown)
+
+        metrics.count('circuit_breaker_opened')
+        print(f"Circuit breaker open: pausing Polygon requests for {self.cooldown:.0f}s "
+              f"after {self.threshold} consecutive failures")
+
+def call_with_retry(call, breaker, before_attempt=None, attempts=None):
+    """
+    Calls a Polygon request function, retrying transient failures.
+
+    429 responses pause every worker through the circuit breaker for the
+    Retry-After period. Other transient failures back off exponentially with
+    full jitter in the calling thread only. Permanent errors such as 404 are
+    raised straight away.
+
+    Args:
+        call: Zero-argument function that makes the request
+        breaker (CircuitBreaker): Breaker shared by all workers
+        before_attempt: Called before every attempt, e.g. to take a rate-limit token
+        attempts (int): Attempts including the first, defaults to POLYGON_RETRY_ATTEMPTS
+
+    Returns:
+        The call's return value
+    """
+    attempts = attempts or POLYGON_RETRY_ATTEMPTS
+
+    for attempt in range(1, attempts + 1):
+        waited = breaker.wait()
+        if waited:
+            metrics.observe('circuit_breaker_wait', waited)
+        if before_attempt:
+            before_attempt()
+
+        try:
+            result = call()
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+
+            breaker.record_failure()
+            throttled = isinstance(e, PolygonHTTPError) and e.status == 429
+            if throttled:
+                metrics.count('api_throttled_responses')
+            if attempt == attempts:
+                raise
+
+            metrics.count('api_retries')
+            if throttled:
+                delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt)
+                breaker.pause(delay)
+                print(f"Polygon is throttling requests, pausing all workers for {delay:.1f}s")
+            else:
+                delay = backoff_delay(attempt)
+                print(f"Transient Polygon error ({str(e)[:100]}), retrying in {delay:.1f}s "
+                      f"(attempt {attempt}/{attempts})")
+                metrics.observe('retry_backoff', delay)
+                time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# How far either side of the date it was fetched for a shares-outstanding value
+# is trusted. Weighted shares outstanding moves with quarterly filings, so a
+# 45 day window means each ticker is refreshed roughly once per quarter.
+SHARES_CACHE_MAX_AGE_DAYS = int(os.environ.get('SHARES_CACHE_MAX_AGE_DAYS', '45'))
+
+# A change in the split adjustment factor larger than this between the cached
+# date and the requested date means a split happened in between.
+SPLIT_FACTOR_TOLERANCE = 0.01
+
+class SharesOutstandingCache:
+    """
+    Persistent cache of weighted shares outstanding per ticker.
+
+    Each ticker holds a list of entries covering an effective date range around
+    the date the value was fetched for, plus the company profile (name,
+    currency, description) that rarely changes. The cache is a single JSON
+    document stored either on local disk or in S3:
+
+    {
+        "version": 1,
+        "tickers": {
+            "AAPL": {
+                "profile": {"name": ..., "currency": ..., "description": ...},
+                "entries": [
+                    {
+                        "as_of": "2024-12-13",
+                        "effective_from": "2024-10-29",
+                        "effective_to": "2025-01-27",
+                        "shares": 15115823000,
+                        "split_factor": 1.0,
+                        "fetched_at": "2024-12-13T20:59:05-05:00"
+                    }
+                ]
+            }
+        }
+    }
+
+    Invalidation policy:
+        - An entry only answers lookups inside its effective range, which is
+          `max_age_days` either side of its as_of date.
+        - An entry is treated as stale if the split adjustment factor on the
+          requested date differs from the one recorded, since a split between
+          the two dates changes the share count.
+        - invalidate() drops entries explicitly, e.g. after a known corporate
+          action.
+
+    Args:
+        path (str): Local file path, used when set
+        s3: boto3 S3 client, used when path is not set
+        bucket (str): S3 bucket holding the cache object
+        key (str): S3 key of the cache object
+        max_age_days (int): Half-width of each entry's effective range
+    """
+    def __init__(self, path=None, s3=None, bucket=None, key=None, max_age_days=SHARES_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.max_age_days = max_age_days
+        self.tickers = {}
+        self.dirty = False
+        # (ticker, before) arguments of invalidate() calls not yet saved
+        self.invalidations = []
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            if self.path:
+                if not os.path.exists(self.path):
+                    return {}
+                with open(self.path, 'r') as cache_file:
+                    document = json.load(cache_file)
+            else:
+                response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+                document = json.loads(response['Body'].read())
+        except Exception as e:
+            print(f"Shares outstanding cache not loaded, starting empty: {str(e)}")
+            return {}
+
+        return document.get('tickers', {})
+
+    def load(self):
+        """
+        Loads the cache document from storage.
+
+        Returns:
+            SharesOutstandingCache: self, for chaining
+        """
+        with self.lock:
+            self.tickers = self._read()
+        print(f"Loaded shares outstanding cache with {len(self.tickers)} tickers")
+        return self
+
+    def save(self):
+        """
+        Writes the cache back to storage if anything changed.
+
+        The stored document is re-read and merged first, so parallel collector
+        runs sharing one cache object only lose entries on an exact race.
+        Entries dropped by invalidate() are removed from the stored document
+        before the merge, so they are not written back.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+
+            merged = self._read()
+            for ticker, before in self.invalidations:
+                self._drop_entries(merged, ticker, before)
+
+            for ticker, cached in self.tickers.items():
+                stored = merged.setdefault(ticker, {'profile': {}, 'entries': []})
+                stored['profile'] = cached.get('profile') or stored.get('profile', {})
+                entries = {entry['as_of']: entry for entry in stored.get('entries', [])}
+                entries.update({entry['as_of']: entry for entry in cached['entries']})
+                stored['entries'] = sorted(entries.values(), key=lambda entry: entry['as_of'])
+
+            body = json.dumps({'version': 1, 'tickers': merged})
+
+            if self.path:
+                with open(self.path, 'w') as cache_file:
+                    cache_file.write(body)
+            else:
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body)
+
+            self.tickers = merged
+            self.invalidations = []
+            self.dirty = False
+
+        print(f"Saved shares outstanding cache ({self.hits} hits, {self.misses} misses)")
+
+    def lookup(self, ticker, trading_date, split_factor=None):
+        """
+        Returns cached shares outstanding for a ticker on a date.
+
+        Args:
+            ticker (str): Current ticker symbol
+            trading_date (str): Date in YYYY-MM-DD format
+            split_factor (float): Unadjusted / adjusted close on trading_date,
+                used to detect splits since the entry was recorded
+
+        Returns:
+            dict: Matching entry merged with the ticker profile, or None if
+                the entry is missing or stale
+        """
+        with self.lock:
+            cached = self.tickers.get(ticker)
+            candidates = [
+                entry for entry in (cached or {}).get('entries', [])
+                if entry['effective_from'] <= trading_date <= entry['effective_to']
+            ]
+
+            if candidates:
+                target = date.fromisoformat(trading_date)
+                entry = min(candidates, key=lambda entry: abs((date.fromisoformat(entry['as_of']) - target).days))
+
+                if split_factor is None or entry.get('split_factor') is None or \
+                        abs(split_factor / entry['split_factor'] - 1) <= SPLIT_FACTOR_TOLERANCE:
+                    self.hits += 1
+                    return {**cached.get('profile', {}), **entry}
+
+            self.misses += 1
+            return None
+
+    def record(self, ticker, trading_date, shares, profile=None, split_factor=None):
+        """
+        Stores a freshly fetched shares outstanding value.
+
+        Args:
+            ticker (str): Current ticker symbol
+            trading_date (str): Date the value was fetched for, YYYY-MM-DD
+            shares (float): Weighted shares outstanding
+            profile (dict): Optional name/currency/description to keep
+            split_factor (float): Unadjusted / adjusted close on trading_date
+        """
+        as_of = date.fromisoformat(trading_date)
+        entry = {
+            'as_of': trading_date,
+            'effective_from': (as_of - timedelta(days=self.max_age_days)).isoformat(),
+            'effective_to': (as_of + timedelta(days=self.max_age_days)).isoformat(),
+            'shares': shares,
+            'split_factor': split_factor,
+            'fetched_at': datetime.now(ZoneInfo("America/New_York")).isoformat()
+        }
+
+        with self.lock:
+            cached = self.tickers.setdefault(ticker, {'profile': {}, 'entries': []})
+            if profile:
+                cached['profile'] = profile
+            cached['entries'] = [e for e in cached['entries'] if e['as_of'] != trading_date] + [entry]
+            cached['entries'].sort(key=lambda e: e['as_of'])
+            self.dirty = True
+
+    def invalidate(self, ticker=None, before=None):
+        """
+        Drops cached entries so they are refetched on next use.
+
+        Args:
+            ticker (str): Only invalidate this ticker, all tickers when None
+            before (str): Only drop entries fetched for dates before this
+                YYYY-MM-DD date, all entries when None
+        """
+        with self.lock:
+            self._drop_entries(self.tickers, ticker, before)
+            self.invalidations.append((ticker, before))
+            self.dirty = True
+
+    @staticmethod
+    def _drop_entries(tickers, ticker, before):
+        for symbol in [ticker] if ticker else list(tickers):
+            cached = tickers.get(symbol)
+            if not cached:
+                continue
+            cached['entries'] = [
+                entry for entry in cached['entries']
+                if before is not None and entry['as_of'] >= before
+            ]
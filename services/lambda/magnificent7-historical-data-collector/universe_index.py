@@ -0,0 +1,319 @@
+import json
+import os
+from datetime import date, timedelta
+
+# Bundled with the function by default; set UNIVERSE_INDEX_KEY to load a
+# refreshed index from the data bucket instead.
+UNIVERSE_INDEX_PATH = os.environ.get(
+    'UNIVERSE_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'universe_index.json')
+)
+UNIVERSE_INDEX_KEY = os.environ.get('UNIVERSE_INDEX_KEY')
+
+# First regular-way trading day for constituents that listed, spun off or
+# re-listed after 2019. No requests are made for them before these dates.
+KNOWN_LISTINGS = {
+    'CARR': '2020-04-03',
+    'OTIS': '2020-04-03',
+    'PLTR': '2020-09-30',
+    'ABNB': '2020-12-10',
+    'CEG': '2022-02-02',
+    'GEHC': '2023-01-04',
+    'KVUE': '2023-05-04',
+    'VLTO': '2023-10-02',
+    'SOLV': '2024-04-01',
+    'GEV': '2024-04-02',
+    'SW': '2024-07-08',
+    'AMTM': '2024-09-30'
+}
+
+# Earlier symbols for constituents that changed ticker. `until` is the last
+# date the old symbol is used. Ticker details only return data under the new
+# symbol a day later than aggregates for META, hence `details_until`.
+KNOWN_RENAMES = {
+    'META': [{'symbol': 'FB', 'until': '2022-06-08', 'details_until': '2022-06-09'}],
+    'HWM': [{'symbol': 'ARNC', 'until': '2020-03-31'}],
+    'RTX': [{'symbol': 'UTX', 'until': '2020-04-02'}],
+    'CTRA': [{'symbol': 'COG', 'until': '2021-10-01'}],
+    'WTW': [{'symbol': 'WLTW', 'until': '2022-01-04'}],
+    'PARA': [{'symbol': 'VIAC', 'until': '2022-02-15'}],
+    'WBD': [{'symbol': 'DISCA', 'until': '2022-04-08'}],
+    'ELV': [{'symbol': 'ANTM', 'until': '2022-06-27'}],
+    'GEN': [{'symbol': 'NLOK', 'until': '2022-11-07'}],
+    'RVTY': [{'symbol': 'PKI', 'until': '2023-05-15'}],
+    'FI': [{'symbol': 'FISV', 'until': '2023-06-06'}],
+    'EG': [{'symbol': 'RE', 'until': '2023-07-07'}],
+    'COR': [{'symbol': 'ABC', 'until': '2023-08-29'}],
+    'DAY': [{'symbol': 'CDAY', 'until': '2024-01-31'}],
+    'DOC': [{'symbol': 'PEAK', 'until': '2024-03-01'}],
+    'CPAY': [{'symbol': 'FLT', 'until': '2024-03-22'}]
+}
+
+class UniverseIndex:
+    """
+    Interval index of S&P 500 membership, listing dates and symbol changes.
+
+    Membership is stored as compact [from, to] intervals per ticker, built
+    from dated holdings snapshots. A null `from` means the ticker was already
+    a member at the earliest snapshot, so it is assumed to be a member for
+    earlier dates too unless its listing date says otherwise. A null `to`
+    means it is still a member at the latest snapshot.
+
+    Membership is only point-in-time back to the earliest snapshot. Before
+    it, constituents that were removed earlier are missing unless the index
+    additions and removals were seeded with add_changes.
+
+    {
+        "version": 1,
+        "snapshots": ["2024-12-06"],
+        "members": {"AAPL": [[null, null]], ...},
+        "weights": {"AAPL": 7.15, ...},
+        "listings": {"GEV": "2024-04-02", ...},
+        "renames": {"META": [{"symbol": "FB", "until": "2022-06-08", ...}], ...}
+    }
+
+    Args:
+        members (dict): Membership intervals keyed by current ticker, in
+            snapshot weight order
+        listings (dict): First trading date keyed by ticker
+        renames (dict): Earlier symbols keyed by current ticker
+        snapshots (list): Dates of the holdings snapshots used
+        weights (dict): Index weights in percent at the latest snapshot, if known
+    """
+    def __init__(self, members, listings=None, renames=None, snapshots=None, weights=None):
+        self.members = members
+        self.listings = listings or {}
+        self.renames = renames or {}
+        self.snapshots = snapshots or []
+        self.weights = weights or {}
+
+    @classmethod
+    def from_snapshots(cls, snapshots, listings=None, renames=None):
+        """
+        Builds membership intervals from dated holdings snapshots.
+
+        Args:
+            snapshots (dict): Ticker lists keyed by YYYY-MM-DD snapshot date
+            listings (dict): Listing dates, defaults to KNOWN_LISTINGS
+            renames (dict): Symbol changes, defaults to KNOWN_RENAMES
+
+        Returns:
+            UniverseIndex: Index covering all snapshot tickers
+        """
+        index = cls(
+            {},
+            listings=KNOWN_LISTINGS if listings is None else listings,
+            renames=KNOWN_RENAMES if renames is None else renames
+        )
+        for snapshot_date in sorted(snapshots):
+            index.add_snapshot(snapshot_date, snapshots[snapshot_date])
+        return index
+
+    def current_members(self):
+        """
+        Returns the tickers that were members at the latest snapshot.
+        """
+        return [ticker for ticker, intervals in self.members.items() if intervals and intervals[-1][1] is None]
+
+    def add_snapshot(self, snapshot_date, tickers, weights=None):
+        """
+        Extends the membership intervals with a newer holdings snapshot.
+
+        Tickers that appear open an interval at the snapshot date, and tickers
+        that are gone close theirs at the previous snapshot, so refreshing the
+        index does not need the older snapshots.
+
+        Args:
+            snapshot_date (str): YYYY-MM-DD date of the holdings, after every
+                snapshot already in the index
+            tickers (list): Constituents at that date, by weight
+            weights (dict): Optional weights in percent keyed by ticker
+        """
+        if self.snapshots and snapshot_date <= self.snapshots[-1]:
+            raise ValueError(f"Snapshot {snapshot_date} is not newer than {self.snapshots[-1]}")
+
+        # The first snapshot's members are assumed to have been members before it
+        previous_date = self.snapshots[-1] if self.snapshots else None
+        previous = set(self.current_members())
+        current = set(tickers)
+
+        for ticker in current - previous:
+            self.members.setdefault(ticker, []).append([snapshot_date if previous_date else None, None])
+        for ticker in previous - current:
+            self.members[ticker][-1][1] = previous_date
+
+        # Keep the latest snapshot's order (by weight) first
+        ordered = {ticker: self.members[ticker] for ticker in tickers}
+        ordered.update({ticker: intervals for ticker, intervals in self.members.items() if ticker not in ordered})
+
+        self.members = ordered
+        self.snapshots = self.snapshots + [snapshot_date]
+        self.weights = weights or {}
+
+    def add_changes(self, changes):
+        """
+        Back-dates membership before the earliest snapshot from dated index
+        additions and removals, e.g. the published S&P 500 change history.
+
+        Changes are applied newest first: an addition starts the ticker's
+        earliest open-ended interval at its date, and a removal adds an
+        interval ending the day before. Changes already applied, and any on
+        or after the earliest snapshot, which the snapshots cover, are
+        skipped, so the same list can be applied again.
+
+        Args:
+            changes (list): {'date': YYYY-MM-DD, 'added': [...], 'removed': [...]}
+                entries, tickers under the symbol the index uses
+
+        Returns:
+            int: Additions and removals applied
+        """
+        if not self.snapshots:
+            raise ValueError("Add a holdings snapshot before seeding earlier changes")
+
+        applied = 0
+        for change in sorted(changes, key=lambda change: change['date'], reverse=True):
+            change_date = change['date']
+            if change_date >= self.snapshots[0]:
+                continue
+
+            for ticker in change.get('added', []):
+                intervals = self.members.get(ticker)
+                if not intervals or any(start == change_date for start, _ in intervals):
+                    # Not a member since, or applied before
+                    continue
+                if intervals[0][0] is None:
+                    intervals[0][0] = change_date
+                    applied += 1
+
+            # The removal is effective before the open, so the last day in
+            # the index is the day before
+            last_day = (date.fromisoformat(change_date) - timedelta(days=1)).isoformat()
+            for ticker in change.get('removed', []):
+                intervals = self.members.setdefault(ticker, [])
+                if any(end == last_day for _, end in intervals):
+                    # Applied before
+                    continue
+                if intervals and intervals[0][0] is None:
+                    # Already open-ended before this date
+                    continue
+                intervals.insert(0, [None, last_day])
+                applied += 1
+
+        return applied
+
+    @classmethod
+    def from_dict(cls, document):
+        return cls(
+            document['members'],
+            listings=document.get('listings'),
+            renames=document.get('renames'),
+            snapshots=document.get('snapshots'),
+            weights=document.get('weights')
+        )
+
+    def to_dict(self):
+        return {
+            'version': 1,
+            'snapshots': self.snapshots,
+            'members': self.members,
+            'weights': self.weights,
+            'listings': self.listings,
+            'renames': self.renames
+        }
+
+    def is_listed(self, ticker, trading_date):
+        listed = self.listings.get(ticker)
+        return listed is None or listed <= trading_date
+
+    def is_member(self, ticker, trading_date):
+        """
+        Returns True if the ticker was listed and in the index on the date.
+        """
+        if not self.is_listed(ticker, trading_date):
+            return False
+
+        return any(
+            (start is None or start <= trading_date) and (end is None or trading_date <= end)
+            for start, end in self.members.get(ticker, [])
+        )
+
+    def constituents(self, trading_date):
+        """
+        Returns the constituents on a date, using current ticker names.
+
+        Args:
+            trading_date (str): Date in YYYY-MM-DD format
+
+        Returns:
+            list: Tickers in latest snapshot weight order
+        """
+        return [ticker for ticker in self.members if self.is_member(ticker, trading_date)]
+
+    def historical_symbol(self, ticker, trading_date, endpoint='aggs'):
+        """
+        Returns the symbol a ticker traded under on a date.
+
+        Args:
+            ticker (str): Current ticker symbol
+            trading_date (str): Date in YYYY-MM-DD format
+            endpoint (str): "aggs" or "details"; some changes show up in
+                ticker details a day later than in aggregates
+
+        Returns:
+            str: The historically accurate ticker symbol for that date
+        """
+        # Oldest change first, so the earliest matching symbol wins
+        changes = sorted(self.renames.get(ticker, []), key=lambda change: change['until'])
+
+        for change in changes:
+            if trading_date <= change.get(f'{endpoint}_until', change['until']):
+                return change['symbol']
+
+        return ticker
+
+_universe_index = None
+_bundled_index = None
+
+def get_universe_index(s3=None, bucket=None):
+    """
+    Lazily loads the universe index once per container.
+
+    Reads s3://bucket/UNIVERSE_INDEX_KEY when that variable is set, otherwise
+    the JSON file bundled with the function.
+
+    Returns:
+        UniverseIndex: The loaded index, or None if none is available
+    """
+    global _universe_index
+    if _universe_index is not None:
+        return _universe_index
+
+    # Without a client the S3 index can't be read yet. Fall back to the
+    # bundled file without caching it as the index, so a later call with a
+    # client still loads the one from S3.
+    if UNIVERSE_INDEX_KEY and s3 is None:
+        global _bundled_index
+        if _bundled_index is None and os.path.exists(UNIVERSE_INDEX_PATH):
+            with open(UNIVERSE_INDEX_PATH, 'r') as index_file:
+                _bundled_index = UniverseIndex.from_dict(json.load(index_file))
+        return _bundled_index
+
+    try:
+        if UNIVERSE_INDEX_KEY:
+            body = s3.get_object(Bucket=bucket, Key=UNIVERSE_INDEX_KEY)['Body'].read()
+            document = json.loads(body)
+        elif os.path.exists(UNIVERSE_INDEX_PATH):
+            with open(UNIVERSE_INDEX_PATH, 'r') as index_file:
+                document = json.load(index_file)
+        else:
+            print("No universe index found, using the static S&P 500 ticker list")
+            return None
+    except Exception as e:
+        print(f"Error loading universe index, using the static S&P 500 ticker list: {str(e)}")
+        return None
+
+    _universe_index = UniverseIndex.from_dict(document)
+    snapshot = _universe_index.snapshots[-1] if _universe_index.snapshots else 'unknown'
+    print(f"Loaded universe index with {len(_universe_index.members)} tickers as of {snapshot}")
+    return _universe_index
@@ -1,27 +1,28 @@
 import json
-from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
+import os
+from collected_dates import filter_collected_dates
+from exchange_calendar import get_calendar
 
-def generate_trading_dates():
+# Range collected by the missing-data workflow when the event does not set one
+DEFAULT_START_DATE = "2020-11-30"
+DEFAULT_END_DATE = "2022-06-10"
+
+def generate_trading_dates(start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE):
     """
     Generate list of trading dates from a range.
     
-    The function creates a list of dates excluding weekends from a range based on inputs.
+    The function reads NYSE sessions between the inclusive start and end
+    dates from the shared exchange calendar, excluding weekends and exchange
+    holidays.
+
+    Args:
+        start_date (str): First date of the range in YYYY-MM-DD format
+        end_date (str): Last date of the range in YYYY-MM-DD format
     
     Returns:
-        list: ISO format dates (YYYY-MM-DD) representing trading days
+        list: ISO format dates (YYYY-MM-DD) representing trading days, newest first
     """
-    start_date = datetime(2020, 11,29)
-    end_date = datetime(2022, 6, 10)
-    dates = []
-    current = end_date
-    end_date = start_date
-    
-    while current > end_date:
-        # Skip weekends (0-4 are Monday to Friday)
-        if current.weekday() < 5:  # 0-4 are Monday to Friday
-            dates.append(current.date().isoformat())
-        current = current - timedelta(days=1)
+    dates = get_calendar().sessions_in_range(start_date, end_date)[::-1]
 
     # Log metadata for monitoring without changing the return structure
     print(json.dumps({
@@ -37,7 +38,17 @@ def generate_trading_dates():
     return dates
 
 def lambda_handler(event, context):
-    dates = generate_trading_dates()
+    # Step Functions passes the execution input, e.g.
+    # {"start_date": "2020-11-30", "end_date": "2022-06-10"}
+    event = event if isinstance(event, dict) else {}
+    dates = generate_trading_dates(
+        event.get('start_date', DEFAULT_START_DATE),
+        event.get('end_date', DEFAULT_END_DATE)
+    )
+
+    # Only emit missing or incomplete dates when the data bucket is configured
+    if os.environ.get('DATA_BUCKET'):
+        dates = filter_collected_dates(dates, os.environ['DATA_BUCKET'])
 
     return {
         'dates': dates
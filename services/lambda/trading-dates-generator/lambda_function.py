@@ -1,27 +1,27 @@
 import json
+import os
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
+from collected_dates import filter_collected_dates
+from exchange_calendar import get_calendar
 
 def generate_trading_dates():
     """
     Generate list of trading dates from today back to 4 years ago.
     
-    The function creates a list of dates excluding weekends, working
-    backward from today. For 4 years of daily data (excluding weekends),
-    we expect around 1,040 dates (260 trading days per year × 4 years).
+    The function reads NYSE sessions from the shared exchange calendar, which
+    excludes weekends and exchange holidays, working backward from today.
+    For 4 years of daily data we expect around 1,005 dates (about 251
+    sessions per year × 4 years).
     
     Returns:
         list: ISO format dates (YYYY-MM-DD) representing trading days
     """
-    dates = []
-    current = datetime.now(ZoneInfo("America/New_York"))
-    end_date = current - timedelta(days=4 * 365)
-    
-    while current > end_date:
-        # Skip weekends (0-4 are Monday to Friday)
-        if current.weekday() < 5:  # 0-4 are Monday to Friday
-            dates.append(current.date().isoformat())
-        current = current - timedelta(days=1)
+    today = datetime.now(ZoneInfo("America/New_York")).date()
+    start_date = today - timedelta(days=4 * 365 - 1)
+
+    # Newest first, matching the order the Map state processes dates
+    dates = get_calendar().sessions_in_range(start_date.isoformat(), today.isoformat())[::-1]
 
     # Log metadata for monitoring without changing the return structure
     print(json.dumps({
@@ -39,6 +39,10 @@ def generate_trading_dates():
 def lambda_handler(event, context):
     dates = generate_trading_dates()
 
+    # Only emit missing or incomplete dates when the data bucket is configured
+    if os.environ.get('DATA_BUCKET'):
+        dates = filter_collected_dates(dates, os.environ['DATA_BUCKET'])
+
     return {
         'dates': dates
     }
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Local replacement for the historical-data-collection Step Functions workflow.
+
+Generates trading dates with the trading-dates-generator functions, then runs
+the collector's lambda_handler for each date (or batch of dates) over a
+process pool. All workers draw from one token bucket, so the combined request
+rate stays within the Polygon plan limit however many processes run. Failed
+dates are retried with exponential backoff and jitter, and progress with an
+ETA is printed as dates complete.
+
+Usage:
+    export POLYGON_API_KEY=...
+    python backfill_runner.py --start-date 2024-01-02 --end-date 2024-12-31 \
+        --workers 4 --requests-per-second 20 --output-dir ./market-data
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from local_storage import LocalS3
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(SERVICES_DIR, 'lambda')
+LAYER_DIR = os.path.join(LAMBDA_DIR, 'layer', 'python')
+
+def load_lambda(name):
+    """
+    Imports a function's lambda_function.py under a unique module name.
+
+    Every function uses the same file name, so they are loaded by path. The
+    function's directory and the shared layer are put on sys.path the way
+    the Lambda runtime would.
+    """
+    directory = os.path.join(LAMBDA_DIR, name)
+    for path in (LAYER_DIR, directory):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(directory, 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class SharedTokenBucket:
+    """
+    Token-bucket rate limiter shared by every worker process.
+
+    Same interface as the collector's TokenBucket, with its state held in
+    shared memory so the budget is global rather than per process.
+
+    Args:
+        rate (float): Tokens added per second (requests per second); 0 or
+            less disables rate limiting
+        capacity (float): Maximum burst size, defaults to one second of tokens
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = multiprocessing.Value('d', self.capacity, lock=False)
+        self.updated_at = multiprocessing.Value('d', time.monotonic(), lock=False)
+        self.lock = multiprocessing.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens.value = min(self.capacity, self.tokens.value + (now - self.updated_at.value) * self.rate)
+                self.updated_at.value = now
+
+                if self.tokens.value >= 1:
+                    self.tokens.value -= 1
+                    return waited
+
+                delay = (1 - self.tokens.value) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+# Set in each worker process by init_worker
+collector = None
+
+def init_worker(rate_limiter, output_dir):
+    """
+    Loads the collector in a worker and points it at the shared rate limiter
+    and the chosen storage.
+    """
+    global collector
+    collector = load_lambda('magnificent7-historical-data-collector')
+    collector.rate_limiter = rate_limiter
+
+    if output_dir:
+        storage = LocalS3(output_dir)
+        collector.get_s3_client = lambda: storage
+
+def collect_with_backoff(event, attempts, base_delay):
+    """
+    Runs the collector for one event, retrying failures with exponential
+    backoff and full jitter.
+
+    Returns:
+        dict: Event, final status, attempts used and elapsed seconds
+    """
+    started = time.monotonic()
+    for attempt in range(1, attempts + 1):
+        try:
+            response = collector.lambda_handler(event, None)
+            status = response['statusCode']
+            error = None if status == 200 else json.loads(response['body']).get('error')
+        except Exception as e:
+            status, error = 500, str(e)
+
+        if status == 200 or attempt == attempts:
+            break
+
+        delay = random.uniform(0, base_delay * 2 ** (attempt - 1))
+        print(f"{event} failed ({error}), retrying in {delay:.0f}s (attempt {attempt}/{attempts})")
+        time.sleep(delay)
+
+    return {
+        'event': event,
+        'status': status,
+        'error': error,
+        'attempts': attempt,
+        'seconds': time.monotonic() - started
+    }
+
+def generate_dates(start_date=None, end_date=None):
+    """
+    Returns the dates to collect, newest first, from the date generators.
+    """
+    if start_date and end_date:
+        generator = load_lambda('trading-dates-generator-range')
+        return generator, generator.generate_trading_dates(start_date, end_date)
+
+    generator = load_lambda('trading-dates-generator')
+    return generator, generator.generate_trading_dates()
+
+def run_backfill(dates, workers, requests_per_second, output_dir=None,
+                 batch_size=1, attempts=3, base_delay=30):
+    """
+    Collects the given dates over a process pool and reports progress.
+
+    Args:
+        dates (list): Dates in YYYY-MM-DD format
+        workers (int): Number of worker processes (the Map MaxConcurrency)
+        requests_per_second (float): Global Polygon request budget
+        output_dir (str): Local directory to store results in, S3 when None
+        batch_size (int): Dates per collector invocation
+        attempts (int): Attempts per event before giving up
+        base_delay (float): Backoff base in seconds
+
+    Returns:
+        list: Per-event results from collect_with_backoff
+    """
+    events = [
+        dates[index] if batch_size == 1 else {'dates': dates[index:index + batch_size]}
+        for index in range(0, len(dates), batch_size)
+    ]
+    rate_limiter = SharedTokenBucket(requests_per_second)
+    results = []
+    dates_done = 0
+    started = time.monotonic()
+
+    print(f"Collecting {len(dates)} dates in {len(events)} invocations with {workers} workers "
+          f"at {requests_per_second} requests/second")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(rate_limiter, output_dir)) as executor:
+        futures = [executor.submit(collect_with_backoff, event, attempts, base_delay) for event in events]
+
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+
+            elapsed = time.monotonic() - started
+            done = len(results)
+            eta = timedelta(seconds=int(elapsed / done * (len(events) - done)))
+            dates_done += 1 if isinstance(result['event'], str) else len(result['event']['dates'])
+            outcome = 'ok' if result['status'] == 200 else f"failed: {result['error']}"
+            print(f"[{done}/{len(events)}] {result['event']} {outcome} in {result['seconds']:.0f}s | "
+                  f"{dates_done / elapsed * 3600:.0f} dates/hour | ETA {eta}")
+
+    failed = [result for result in results if result['status'] != 200]
+    print(f"\nBackfill complete in {timedelta(seconds=int(time.monotonic() - started))}: "
+          f"{len(results) - len(failed)} succeeded, {len(failed)} failed")
+    for result in failed:
+        print(f"  {result['event']}: {result['error']}")
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a historical backfill locally without Step Functions.')
+    parser.add_argument('--start-date', help='First date (YYYY-MM-DD); defaults to the last 4 years')
+    parser.add_argument('--end-date', help='Last date (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes')
+    parser.add_argument('--requests-per-second', type=float,
+                        default=float(os.environ.get('POLYGON_REQUESTS_PER_SECOND', '5')),
+                        help='Global Polygon request budget shared by all workers')
+    parser.add_argument('--output-dir', help='Store results in this directory instead of S3')
+    parser.add_argument('--batch-size', type=int, default=1, help='Dates per collector invocation')
+    parser.add_argument('--attempts', type=int, default=3, help='Attempts per date')
+    parser.add_argument('--base-delay', type=float, default=30, help='Retry backoff base in seconds')
+    parser.add_argument('--include-collected', action='store_true',
+                        help='Do not skip dates that are already collected')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.environ.setdefault('DATA_BUCKET', 'local')
+
+    # Reruns resume from the collector's manifests; workers inherit this
+    os.environ.setdefault('USE_MANIFEST', 'true')
+
+    generator, dates = generate_dates(args.start_date, args.end_date)
+
+    if not args.include_collected and os.environ.get('DATA_BUCKET'):
+        storage = LocalS3(args.output_dir) if args.output_dir else None
+        dates = generator.filter_collected_dates(dates, os.environ['DATA_BUCKET'], s3=storage)
+
+    run_backfill(
+        dates, args.workers, args.requests_per_second,
+        output_dir=args.output_dir, batch_size=args.batch_size,
+        attempts=args.attempts, base_delay=args.base_delay
+    )
+
+if __name__ == '__main__':
+    main()
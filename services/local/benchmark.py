@@ -0,0 +1,305 @@
+"""
+Measures collector throughput against a simulated Polygon API.
+
+Starts fake_polygon's server, points the collector's RESTClient at it and
+stores results with LocalS3 in a temporary directory, so no API quota or AWS
+resources are used. Each run calls lambda_handler in a fresh process (a cold
+container) and reports:
+
+- dates/hour and requests/second
+- thread-seconds spent sleeping in the rate limiter, waiting on the API
+  (each HTTP attempt, excluding sleeps between retries) and writing to storage
+- thread-seconds spent in retry backoff and paused by the circuit breaker
+  (including Retry-After pauses), and the retries call_with_retry made
+- bytes written, from the handler's metrics summary
+- CPU seconds and peak resident memory of the process
+
+The scenario is deterministic for a given seed, so results saved with
+--output on one commit can be compared with --compare on another.
+
+Usage:
+    python benchmark.py --dates 5 --latency-ms 40 --output baseline.json
+    python benchmark.py --dates 5 --latency-ms 40 --compare baseline.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backfill_runner import LAYER_DIR, load_lambda
+from fake_polygon import FakePolygonServer
+from local_storage import LocalS3
+
+if LAYER_DIR not in sys.path:
+    sys.path.insert(0, LAYER_DIR)
+
+from exchange_calendar import get_calendar
+
+# Metrics where a lower value is better, for --compare
+LOWER_IS_BETTER = {'wall_seconds', 'cpu_seconds', 'rate_limit_sleep_seconds', 'api_wait_seconds',
+                   'retry_backoff_seconds', 'circuit_breaker_wait_seconds', 'storage_seconds',
+                   'peak_rss_mb', 'requests', 'api_retries'}
+
+class TimedStorage:
+    """
+    Wraps a storage client and accumulates time spent in put_object.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self.exceptions = storage.exceptions
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def put_object(self, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.storage.put_object(**kwargs)
+        finally:
+            with self.lock:
+                self.seconds += time.perf_counter() - started
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+class TimedRateLimiter:
+    """
+    Wraps the collector's rate limiter and accumulates time spent waiting.
+    """
+    def __init__(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = self.rate_limiter.acquire()
+        with self.lock:
+            self.seconds += waited
+        return waited
+
+def timed_client_class(rest_client):
+    """
+    Returns a RESTClient subclass that accumulates time spent in HTTP requests.
+    """
+    class TimedRESTClient(rest_client):
+        seconds = 0.0
+        lock = threading.Lock()
+
+        def _get(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super()._get(*args, **kwargs)
+            finally:
+                with TimedRESTClient.lock:
+                    TimedRESTClient.seconds += time.perf_counter() - started
+
+    return TimedRESTClient
+
+def run_once(events, environment):
+    """
+    Runs the collector for each event in this (fresh) process.
+
+    Args:
+        events (list): lambda_handler events, run one after another
+        environment (dict): Environment variables for the collector
+
+    Returns:
+        dict: Timings, memory and handler status codes
+    """
+    os.environ.update(environment)
+
+    collector = load_lambda('magnificent7-historical-data-collector')
+    storage = TimedStorage(LocalS3(environment['BENCHMARK_OUTPUT_DIR']))
+    rate_limiter = TimedRateLimiter(collector.rate_limiter)
+    collector.get_s3_client = lambda: storage
+    collector.rate_limiter = rate_limiter
+    collector.RESTClient = timed_client_class(collector.RESTClient)
+
+    statuses = []
+    counters = {}
+    sleeps = {}
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+
+    # The collector logs every ticker; keep that cost but not the output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for event in events:
+            response = collector.lambda_handler(event, None)
+            statuses.append(response['statusCode'])
+            summary = json.loads(response['body']).get('metrics', {})
+            for name, value in summary.get('counters', {}).items():
+                counters[name] = counters.get(name, 0) + value
+            # Sleeps between retries happen in call_with_retry, outside the
+            # rate limiter and the HTTP request
+            for name in ('retry_backoff', 'circuit_breaker_wait'):
+                seconds = summary.get('operations', {}).get(name, {}).get('total_seconds', 0)
+                sleeps[name] = sleeps.get(name, 0) + seconds
+
+    return {
+        'wall_seconds': time.perf_counter() - started,
+        'cpu_seconds': time.process_time() - cpu_started,
+        'rate_limit_sleep_seconds': rate_limiter.seconds,
+        'api_wait_seconds': collector.RESTClient.seconds,
+        'retry_backoff_seconds': sleeps.get('retry_backoff', 0),
+        'circuit_breaker_wait_seconds': sleeps.get('circuit_breaker_wait', 0),
+        'storage_seconds': storage.seconds,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'api_retries': counters.get('api_retries', 0),
+        'bytes_written': counters.get('bytes_written', 0),
+        'statuses': statuses
+    }
+
+def benchmark_dates(count, end_date):
+    """
+    Returns the last `count` sessions up to end_date, newest first.
+    """
+    calendar = get_calendar()
+    sessions = calendar.sessions_in_range('2000-01-01', end_date)
+    return sorted(sessions[-count:], reverse=True)
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(args):
+    """
+    Runs the configured scenario args.repeat times and summarizes the runs.
+
+    Returns:
+        dict: Scenario settings, per-run metrics and medians
+    """
+    dates = benchmark_dates(args.dates, args.end_date)
+    events = [
+        dates[index] if args.batch_size == 1 else {'dates': dates[index:index + args.batch_size]}
+        for index in range(0, len(dates), args.batch_size)
+    ]
+
+    server = FakePolygonServer(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed
+    ).start()
+
+    # Fresh processes keep imports, caches and peak memory from leaking between runs
+    context = multiprocessing.get_context('spawn')
+    runs = []
+
+    try:
+        for run in range(1, args.repeat + 1):
+            server.reset_stats()
+            with tempfile.TemporaryDirectory() as output_dir:
+                environment = {
+                    'POLYGON_API_KEY': 'benchmark',
+                    'POLYGON_BASE_URL': server.base_url,
+                    'POLYGON_REQUESTS_PER_SECOND': str(args.requests_per_second),
+                    'POLYGON_MAX_WORKERS': str(args.max_workers),
+                    'AGGS_MODE': args.aggs_mode,
+                    'MARKET_CAP_SOURCE': args.market_cap_source,
+                    'DATA_BUCKET': 'benchmark',
+                    'BENCHMARK_OUTPUT_DIR': output_dir
+                }
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_once, events, environment).result()
+
+            stats = server.stats
+            result.update({
+                'dates_per_hour': len(dates) / result['wall_seconds'] * 3600,
+                'requests': stats['requests'],
+                'requests_per_second': stats['requests'] / result['wall_seconds'],
+                'by_endpoint': stats['by_endpoint'],
+                'by_status': stats['by_status']
+            })
+            runs.append(result)
+            print(f"Run {run}/{args.repeat}: {result['dates_per_hour']:.0f} dates/hour, "
+                  f"{result['requests_per_second']:.1f} requests/second, statuses {result['statuses']}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    metrics = [name for name, value in runs[0].items() if isinstance(value, (int, float))]
+    return {
+        'commit': current_commit(),
+        'scenario': {
+            'dates': dates,
+            'batch_size': args.batch_size,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'retry_after': args.retry_after,
+            'requests_per_second': args.requests_per_second,
+            'max_workers': args.max_workers,
+            'aggs_mode': args.aggs_mode,
+            'market_cap_source': args.market_cap_source,
+            'seed': args.seed
+        },
+        'median': {name: statistics.median(run[name] for run in runs) for name in metrics},
+        'runs': runs
+    }
+
+def print_report(report, baseline=None):
+    """
+    Prints median metrics, with the change from a baseline report if given.
+    """
+    print(f"\nMedian of {len(report['runs'])} runs at commit {report['commit']}:")
+    if baseline and baseline['scenario'] != report['scenario']:
+        print("  Warning: baseline was recorded with a different scenario")
+
+    for name, value in report['median'].items():
+        line = f"  {name:<26} {value:>12.2f}"
+        if baseline and name in baseline['median'] and baseline['median'][name]:
+            previous = baseline['median'][name]
+            change = (value - previous) / previous * 100
+            better = change < 0 if name in LOWER_IS_BETTER else change > 0
+            flag = '' if abs(change) < 5 else (' (better)' if better else ' (worse)')
+            line += f"  {previous:>12.2f}  {change:+7.1f}%{flag}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the collector against a simulated Polygon API.')
+    parser.add_argument('--dates', type=int, default=3, help='Number of sessions to collect')
+    parser.add_argument('--end-date', default='2024-12-13', help='Last session to collect (YYYY-MM-DD)')
+    parser.add_argument('--batch-size', type=int, default=1, help='Dates per lambda_handler call')
+    parser.add_argument('--latency-ms', type=float, default=40, help='Mean simulated API latency')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='Latency varies by up to this much')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='Fraction of requests answered with a 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds for 429 responses')
+    parser.add_argument('--requests-per-second', type=float, default=100, help="Collector's rate limit")
+    parser.add_argument('--max-workers', type=int, default=8, help="Collector's thread pool size")
+    parser.add_argument('--aggs-mode', default='ticker', choices=['ticker', 'grouped'])
+    parser.add_argument('--market-cap-source', default='details', choices=['details', 'shares_cache'])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs to take the median over')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for simulated latency and faults')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--compare', help='Baseline report JSON to compare against')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == '__main__':
+    main()
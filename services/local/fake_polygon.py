@@ -0,0 +1,300 @@
+"""
+Local stand-in for the Polygon.io REST API, used by the benchmark.
+
+Serves the endpoints the collector calls with deterministic data derived
+from the ticker symbol, so every run does the same work. Latency, error
+rate and 429 (rate limited) responses are configurable.
+
+Run on its own to point any RESTClient at it:
+    python fake_polygon.py --port 8765 --latency-ms 40
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+from backfill_runner import LAMBDA_DIR, LAYER_DIR
+
+if LAYER_DIR not in sys.path:
+    sys.path.insert(0, LAYER_DIR)
+
+from exchange_calendar import get_calendar
+
+TICKER_DETAILS_PATH = re.compile(r'^/v3/reference/tickers/(?P<ticker>[^/]+)$')
+AGGS_PATH = re.compile(
+    r'^/v2/aggs/ticker/(?P<ticker>[^/]+)/range/(?P<multiplier>\d+)/(?P<timespan>minute|hour|day)'
+    r'/(?P<from_>[\d-]+)/(?P<to>[\d-]+)$'
+)
+GROUPED_PATH = re.compile(r'^/v2/aggs/grouped/locale/us/market/stocks/(?P<date>[\d-]+)$')
+
+def default_tickers():
+    """
+    Returns every symbol in the collector's bundled universe index, including
+    earlier symbols of renamed tickers, for grouped daily responses.
+    """
+    path = os.path.join(LAMBDA_DIR, 'magnificent7-historical-data-collector', 'universe_index.json')
+    with open(path, 'r') as index_file:
+        document = json.load(index_file)
+
+    tickers = list(document['members'])
+    for changes in document.get('renames', {}).values():
+        tickers.extend(change['symbol'] for change in changes)
+    return tickers
+
+def ticker_profile(ticker):
+    """
+    Returns a stable (close price, shares outstanding) pair for a ticker.
+    """
+    seed = zlib.crc32(ticker.encode())
+    close = 20 + seed % 50000 / 100
+    shares = 10 ** 8 + seed % (10 ** 10)
+    return close, shares
+
+def daily_bar(ticker, trading_date):
+    close, _ = ticker_profile(ticker)
+    # Drift the price a little by date so bars differ from day to day
+    close *= 1 + (zlib.crc32(f"{ticker}{trading_date}".encode()) % 200 - 100) / 10000
+    session_start = datetime.combine(date.fromisoformat(trading_date), datetime.min.time(), ZoneInfo("America/New_York"))
+    return {
+        'o': round(close * 0.995, 2),
+        'h': round(close * 1.01, 2),
+        'l': round(close * 0.99, 2),
+        'c': round(close, 2),
+        'v': 1000000 + zlib.crc32(ticker.encode()) % 50000000,
+        'vw': round(close * 1.001, 4),
+        't': int(session_start.timestamp() * 1000),
+        'n': 50000
+    }
+
+def to_milliseconds(value, end=False):
+    """
+    Converts a YYYY-MM-DD date or millisecond timestamp path segment to
+    milliseconds, taking the end of the day for `to` dates.
+    """
+    if '-' not in value:
+        return int(value)
+    day = date.fromisoformat(value) + timedelta(days=1 if end else 0)
+    start = datetime.combine(day, datetime.min.time(), ZoneInfo("America/New_York"))
+    return int(start.timestamp() * 1000) - (1 if end else 0)
+
+def intraday_bars(ticker, multiplier, timespan, from_ms, to_ms, limit):
+    """
+    Yields bars every multiplier minutes or hours from 4:00 to 20:00 Eastern
+    on each session between from_ms and to_ms. As on Polygon, limit counts
+    the minute aggregates the bars are built from, so a page holds up to
+    limit / 60 hour bars.
+    """
+    eastern = ZoneInfo("America/New_York")
+    step = timedelta(minutes=multiplier) if timespan == 'minute' else timedelta(hours=multiplier)
+    limit = max(1, limit // int(step.total_seconds() // 60))
+    first = datetime.fromtimestamp(from_ms / 1000, eastern).date().isoformat()
+    last = datetime.fromtimestamp(to_ms / 1000, eastern).date().isoformat()
+    count = 0
+
+    for session in get_calendar().sessions_in_range(first, last):
+        bar = daily_bar(ticker, session)
+        current = datetime.combine(date.fromisoformat(session), datetime.min.time(), eastern).replace(hour=4)
+        session_end = current.replace(hour=20)
+        while current < session_end:
+            timestamp = int(current.timestamp() * 1000)
+            if from_ms <= timestamp <= to_ms:
+                if count >= limit:
+                    return
+                # Walk the price through the day so bars are not identical
+                drift = 1 + (current.hour * 60 + current.minute - 570) / 100000
+                yield {**bar, 't': timestamp, 'o': round(bar['o'] * drift, 2), 'c': round(bar['c'] * drift, 2),
+                       'v': bar['v'] // 960, 'n': 50}
+                count += 1
+            current += step
+
+class FakePolygonServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering ticker details and aggregates requests.
+
+    Args:
+        port (int): Port to listen on, 0 picks a free one
+        latency_ms (float): Mean response delay in milliseconds
+        jitter_ms (float): Delay varies uniformly by up to this much either way
+        error_rate (float): Fraction of requests answered with a 500
+        throttle_rate (float): Fraction of requests answered with a 429
+        retry_after (int): Retry-After seconds sent with 429 responses
+        tickers (list): Symbols included in grouped daily responses,
+            defaults to the collector's universe index
+        seed (int): Seed for the latency and fault random draws
+    """
+    daemon_threads = True
+    # Lots of clients connect at once when the collector's thread pool starts
+    request_queue_size = 128
+
+    def __init__(self, port=0, latency_ms=0, jitter_ms=0, error_rate=0, throttle_rate=0,
+                 retry_after=1, tickers=None, seed=0):
+        super().__init__(('127.0.0.1', port), FakePolygonHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.tickers = tickers if tickers is not None else default_tickers()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'by_endpoint': {}, 'by_status': {}}
+
+    def record(self, endpoint, status):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['by_endpoint'][endpoint] = self.stats['by_endpoint'].get(endpoint, 0) + 1
+            self.stats['by_status'][str(status)] = self.stats['by_status'].get(str(status), 0) + 1
+
+    def draw(self):
+        """
+        Returns (delay seconds, fault roll) for one request.
+        """
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            return max(0, self.latency_ms + jitter) / 1000, self.random.random()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+class FakePolygonHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pool behaves as it does against Polygon
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, document, headers=None):
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        routes = (
+            ('ticker_details', TICKER_DETAILS_PATH, self.ticker_details),
+            ('aggs', AGGS_PATH, self.aggs),
+            ('grouped_daily_aggs', GROUPED_PATH, self.grouped_daily_aggs)
+        )
+        for endpoint, pattern, respond in routes:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            self.server.record('unknown', 404)
+            self.send_json(404, {'status': 'NOT_FOUND', 'message': 'Unknown endpoint'})
+            return
+
+        delay, roll = self.server.draw()
+        time.sleep(delay)
+
+        if roll < self.server.throttle_rate:
+            self.server.record(endpoint, 429)
+            self.send_json(429, {'status': 'ERROR', 'error': 'You have exceeded the maximum requests per minute'},
+                           headers={'Retry-After': str(self.server.retry_after)})
+            return
+
+        if roll < self.server.throttle_rate + self.server.error_rate:
+            self.server.record(endpoint, 500)
+            self.send_json(500, {'status': 'ERROR', 'error': 'Internal server error'})
+            return
+
+        self.server.record(endpoint, 200)
+        self.send_json(200, respond(params=params, **match.groupdict()))
+
+    def ticker_details(self, ticker, params):
+        close, shares = ticker_profile(ticker)
+        return {
+            'request_id': 'benchmark',
+            'status': 'OK',
+            'results': {
+                'ticker': ticker,
+                'name': f"{ticker} Inc.",
+                'market': 'stocks',
+                'locale': 'us',
+                'active': True,
+                'currency_name': 'usd',
+                'description': f"Simulated company for {ticker}.",
+                'market_cap': close * shares,
+                'share_class_shares_outstanding': shares,
+                'weighted_shares_outstanding': shares
+            }
+        }
+
+    def aggs(self, ticker, multiplier, timespan, from_, to, params):
+        if timespan == 'day':
+            results = [daily_bar(ticker, session) for session in get_calendar().sessions_in_range(from_, to)]
+        else:
+            results = list(intraday_bars(
+                ticker, int(multiplier), timespan, to_milliseconds(from_), to_milliseconds(to, end=True),
+                int(params.get('limit', 5000))
+            ))
+        return {
+            'ticker': ticker,
+            'adjusted': params.get('adjusted', 'true') == 'true',
+            'queryCount': len(results),
+            'resultsCount': len(results),
+            'status': 'OK',
+            'request_id': 'benchmark',
+            'results': results
+        }
+
+    def grouped_daily_aggs(self, date, params):
+        results = [{'T': ticker, **daily_bar(ticker, date)} for ticker in self.server.tickers]
+        return {
+            'adjusted': params.get('adjusted', 'true') == 'true',
+            'queryCount': len(results),
+            'resultsCount': len(results),
+            'status': 'OK',
+            'request_id': 'benchmark',
+            'results': results
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a simulated Polygon.io REST API.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=40)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    server = FakePolygonServer(
+        port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after
+    )
+    print(f"Serving simulated Polygon API at {server.base_url}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import io
+import os
+
+class LocalS3:
+    """
+    Minimal stand-in for the boto3 S3 client that stores objects on disk.
+
+    Implements the calls the collector, date generators and Parquet writer
+    make, so they can run against a local directory instead of a bucket.
+    Objects are stored at <root>/<key>; the bucket name is ignored.
+
+    Args:
+        root (str): Directory that plays the role of the bucket
+    """
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self._path(Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        body = Body.encode() if isinstance(Body, str) else Body
+        if hasattr(body, 'read'):
+            body = body.read()
+
+        # Write then rename so parallel readers never see a partial object
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as object_file:
+            object_file.write(body)
+        os.replace(temp_path, path)
+
+        return {'ContentLength': len(body)}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        path = self._path(Key)
+        if not os.path.isfile(path):
+            raise self.exceptions.NoSuchKey(Key)
+
+        with open(path, 'rb') as object_file:
+            body = object_file.read()
+
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        path = self._path(Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def _keys(self, prefix):
+        # Only walk the deepest directory the prefix pins down
+        directory = os.path.dirname(self._path(prefix)) if '/' in prefix else self.root
+        keys = []
+        for current, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith('.tmp'):
+                    continue
+                key = os.path.relpath(os.path.join(current, filename), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, **kwargs):
+        keys = self._keys(Prefix)
+        if not Delimiter:
+            return {
+                'Contents': [{'Key': key, 'Size': os.path.getsize(self._path(key))} for key in keys],
+                'KeyCount': len(keys),
+                'IsTruncated': False
+            }
+
+        contents = []
+        common_prefixes = set()
+        for key in keys:
+            remainder = key[len(Prefix):]
+            if Delimiter in remainder:
+                common_prefixes.add(Prefix + remainder.split(Delimiter)[0] + Delimiter)
+            else:
+                contents.append({'Key': key, 'Size': os.path.getsize(self._path(key))})
+
+        return {
+            'Contents': contents,
+            'CommonPrefixes': [{'Prefix': prefix} for prefix in sorted(common_prefixes)],
+            'KeyCount': len(contents) + len(common_prefixes),
+            'IsTruncated': False
+        }
+
+    def get_paginator(self, operation_name):
+        """
+        Returns a paginator that yields a single page, which is all a local
+        directory needs.
+        """
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                yield getattr(client, operation_name)(**kwargs)
+
+        return Paginator()